@@ -1,4 +1,6 @@
-from flask import Flask
+import sys
+
+from flask import Flask, jsonify
 from flask_cors import CORS
 from app.config import Config
 from app.extensions import get_mongo
@@ -22,4 +24,25 @@ def create_app():
     app.register_blueprint(face.bp, url_prefix="/api/face")
     app.register_blueprint(recognize.bp)  # No prefix, defined in blueprint
 
+    # The ML stack loads lazily; routes that don't touch faces never wait for it.
+    # Under gunicorn this may run in the --preload master, where TensorFlow must not be
+    # loaded before the fork: workers warm up from the post_fork hook in gunicorn.conf.py.
+    from app.services.ml_service import ml_service
+    if Config.FACE_MODEL_WARMUP and "gunicorn" not in sys.modules:
+        ml_service.warm_up()
+
+    @app.route("/healthz")
+    def healthz():
+        """Liveness: the process is serving requests, whether or not the model is loaded."""
+        model = ml_service.status()
+        return jsonify({"status": "ok", "modelReady": model["ready"], "model": model}), 200
+
+    @app.route("/readyz")
+    def readyz():
+        """Readiness: 503 until a Facenet512 forward pass has succeeded in this worker."""
+        model = ml_service.status()
+        if not model["ready"]:
+            return jsonify({"status": "loading", "modelReady": False, "model": model}), 503
+        return jsonify({"status": "ok", "modelReady": True, "model": model}), 200
+
     return app
@@ -7,6 +7,13 @@ load_dotenv()
 class Config:
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
     DATABASE_NAME = os.getenv("DATABASE_NAME", "face_attendance_system")
+    # One pooled MongoClient per process (see extensions.get_mongo)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
     JWT_SECRET = os.getenv("JWT_SECRET", "change-me-in-production")
     JWT_ALGORITHM = "HS256"
     JWT_EXPIRATION_HOURS = 24
@@ -22,3 +29,76 @@ class Config:
     # Face recognition
     FACE_SIMILARITY_THRESHOLD = 0.6  # cosine similarity; above = same person
     FACE_DUPLICATE_THRESHOLD = 0.7   # reject if new face matches any existing
+    # "reject" refuses a registration that matches another user; "flag" stores it with
+    # the conflicts under faceDuplicateReview for an admin to check.
+    FACE_DUPLICATE_ACTION = os.getenv("FACE_DUPLICATE_ACTION", "reject").strip().lower()
+    if FACE_DUPLICATE_ACTION not in ("reject", "flag"):
+        # A typo must not silently turn off the early duplicate rejection.
+        raise ValueError(f"FACE_DUPLICATE_ACTION must be 'reject' or 'flag', got {FACE_DUPLICATE_ACTION!r}")
+    FACE_DUPLICATE_TOP_K = int(os.getenv("FACE_DUPLICATE_TOP_K", "5"))  # conflicts reported per check
+    # Stored embedding encoding: "float16" (2 bytes/dim) or "int8" (1 byte/dim + per-row scale).
+    FACE_EMBEDDING_FORMAT = os.getenv("FACE_EMBEDDING_FORMAT", "float16")
+
+    # Gallery search: "exact" scans every prototype; "ivf" probes a NumPy IVF index
+    # and re-ranks the top-k candidate users exactly.
+    FACE_SEARCH_MODE = os.getenv("FACE_SEARCH_MODE", "exact")
+    FACE_ANN_NLIST = int(os.getenv("FACE_ANN_NLIST", "0"))  # 0 = sqrt(#prototypes)
+    FACE_ANN_NPROBE = int(os.getenv("FACE_ANN_NPROBE", "8"))
+    FACE_ANN_TOP_K = int(os.getenv("FACE_ANN_TOP_K", "20"))
+    FACE_ANN_MIN_PROTOTYPES = int(os.getenv("FACE_ANN_MIN_PROTOTYPES", "20000"))
+
+    # Users whose only embedding is the single-photo `faceEncoding` from before prototypes
+    # stay out of live matching unless this is enabled (or they are migrated/re-registered).
+    FACE_GALLERY_LEGACY_ENCODINGS = os.getenv("FACE_GALLERY_LEGACY_ENCODINGS", "false").lower() == "true"
+
+    # Gallery snapshot shared by all workers (np.memmap) for instant warm starts; "" disables.
+    # It holds every face embedding, so by default it lives in a private state directory
+    # outside the source tree (written with mode 0600).
+    FACE_GALLERY_SNAPSHOT_PATH = os.getenv(
+        "FACE_GALLERY_SNAPSHOT_PATH",
+        os.path.join(
+            os.getenv("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state"),
+            "finalface",
+            "gallery.snapshot",
+        ),
+    )
+
+    # Micro-batching of Facenet512 forward passes across concurrent requests.
+    FACE_MICROBATCH_ENABLED = os.getenv("FACE_MICROBATCH_ENABLED", "true").lower() == "true"
+    FACE_MICROBATCH_MAX_SIZE = int(os.getenv("FACE_MICROBATCH_MAX_SIZE", "32"))
+    FACE_MICROBATCH_MAX_WAIT_MS = float(os.getenv("FACE_MICROBATCH_MAX_WAIT_MS", "5"))
+
+    # Largest request body Flask accepts (413 above it), and the largest frame /verify and
+    # /recognize will read; base64 JSON frames get the 4/3 encoding overhead on top.
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(16 * 1024 * 1024)))
+    FRAME_MAX_BYTES = int(os.getenv("FRAME_MAX_BYTES", str(4 * 1024 * 1024)))
+
+    # Frame preprocessing: large JPEGs are decoded at reduced resolution (longest side kept
+    # >= FRAME_DECODE_MAX_SIDE) and Haar detection runs on a copy downscaled to FRAME_DETECT_MAX_SIDE.
+    FRAME_DECODE_MAX_SIDE = int(os.getenv("FRAME_DECODE_MAX_SIDE", "1280"))
+    FRAME_DETECT_MAX_SIDE = int(os.getenv("FRAME_DETECT_MAX_SIDE", "640"))
+
+    # Per-session face tracking: a face matched to a student keeps that identity while its box
+    # overlaps (IoU) across frames, skipping Facenet512 for up to LOCK_FRAMES frames / LOCK_SECONDS.
+    FACE_TRACK_ENABLED = os.getenv("FACE_TRACK_ENABLED", "true").lower() == "true"
+    FACE_TRACK_LOCK_FRAMES = int(os.getenv("FACE_TRACK_LOCK_FRAMES", "10"))
+    FACE_TRACK_LOCK_SECONDS = float(os.getenv("FACE_TRACK_LOCK_SECONDS", "15"))
+    FACE_TRACK_MIN_IOU = float(os.getenv("FACE_TRACK_MIN_IOU", "0.5"))
+    FACE_TRACK_MAX_IDLE_SECONDS = float(os.getenv("FACE_TRACK_MAX_IDLE_SECONDS", "5"))
+
+    # Attendance marks are buffered and written with one bulk_write per flush interval.
+    ATTENDANCE_FLUSH_INTERVAL_MS = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL_MS", "100"))
+    ATTENDANCE_FLUSH_MAX_BATCH = int(os.getenv("ATTENDANCE_FLUSH_MAX_BATCH", "500"))
+
+    # Load Facenet512 on a background thread at startup instead of on the first face request
+    # (under gunicorn: per worker, from the post_fork hook in gunicorn.conf.py).
+    FACE_MODEL_WARMUP = os.getenv("FACE_MODEL_WARMUP", "true").lower() == "true"
+
+    # "local" loads Facenet512 in every web worker; "pool" sends crops over shared memory
+    # to the worker pool started with `python -m scripts.inference_server`.
+    FACE_INFERENCE_MODE = os.getenv("FACE_INFERENCE_MODE", "local")
+    FACE_INFERENCE_POOL_HOST = os.getenv("FACE_INFERENCE_POOL_HOST", "127.0.0.1")
+    FACE_INFERENCE_POOL_PORT = int(os.getenv("FACE_INFERENCE_POOL_PORT", "6100"))
+    FACE_INFERENCE_POOL_WORKERS = int(os.getenv("FACE_INFERENCE_POOL_WORKERS", "2"))
+    # Shared secret for the pool's socket handshake; required in pool mode, with no fallback.
+    FACE_INFERENCE_POOL_AUTHKEY = os.getenv("FACE_INFERENCE_POOL_AUTHKEY", "")
@@ -1,6 +1,8 @@
 from flask import Flask
 from flask_cors import CORS
-from pymongo import MongoClient
+import os
+import threading
+from pymongo import MongoClient, monitoring
 import jwt
 from datetime import datetime, timedelta
 from functools import wraps
@@ -8,9 +10,125 @@ from flask import request, jsonify
 from app.config import Config
 
 
+class _PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters, fed by PyMongo's CMAP events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.peak_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.pools_cleared = 0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count(pools_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count(created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count(closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count(checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._count(checkouts=1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._count(checked_out=-1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+                "open": self.created - self.closed,
+                "inUse": self.checked_out,
+                "peakInUse": self.peak_checked_out,
+                "utilization": round(self.checked_out / max(1, Config.MONGO_MAX_POOL_SIZE), 3),
+                "checkouts": self.checkouts,
+                "checkoutFailures": self.checkout_failures,
+                "created": self.created,
+                "closed": self.closed,
+                "poolsCleared": self.pools_cleared,
+            }
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_pool_stats = _PoolStats()
+
+
+def _reset_after_fork():
+    # MongoClient isn't fork-safe: drop the parent's client so the child builds its own.
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+    _pool_stats.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_mongo_client() -> MongoClient:
+    """Process-wide pooled MongoClient, re-created after a fork (e.g. gunicorn --preload)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = MongoClient(
+                    Config.MONGO_URI,
+                    maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                    minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+                    waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                    connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    event_listeners=[_pool_stats],
+                )
+                _client_pid = pid
+    return _client
+
+
 def get_mongo():
-    client = MongoClient(Config.MONGO_URI)
-    return client[Config.DATABASE_NAME]
+    return get_mongo_client()[Config.DATABASE_NAME]
+
+
+def mongo_pool_stats():
+    """Connection pool utilization for this process."""
+    return {"pid": os.getpid(), **_pool_stats.snapshot()}
 
 
 def create_jwt_token(user_id: str, email: str, role: str) -> str:
@@ -1,5 +1,6 @@
 from app.models.user import User
 from app.models.session import Session
 from app.models.attendance import Attendance
+from app.models.attendance_rollup import AttendanceRollup
 
-__all__ = ["User", "Session", "Attendance"]
+__all__ = ["User", "Session", "Attendance", "AttendanceRollup"]
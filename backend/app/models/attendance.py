@@ -1,11 +1,28 @@
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 
 class Attendance:
+    INDEXES = [
+        # One record per student per session; the attendance writer's upserts rely on it.
+        # Also serves every sessionId-only lookup (present set, session attendance, counts).
+        IndexModel([("sessionId", ASCENDING), ("studentId", ASCENDING)], unique=True),
+        # a student's own history and stats, newest first
+        # (_id is the list's keyset tie-breaker, so the cursor sort stays index-backed)
+        IndexModel([("studentId", ASCENDING), ("date", DESCENDING), ("time", DESCENDING), ("_id", DESCENDING)]),
+        # admin/faculty attendance list and today's count
+        IndexModel([("date", DESCENDING), ("time", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("class", ASCENDING), ("date", DESCENDING), ("time", DESCENDING), ("_id", DESCENDING)]),
+    ]
+
     @staticmethod
     def collection(db):
         return db.attendances
 
+    @staticmethod
+    def ensure_indexes(db):
+        Attendance.collection(db).create_indexes(Attendance.INDEXES)
+
     @staticmethod
     def to_json(doc):
         if not doc:
@@ -0,0 +1,61 @@
+from pymongo import ASCENDING, IndexModel
+
+
+class AttendanceRollup:
+    """
+    Pre-aggregated attendance counters, one document per (kind, key):
+    - day:             {date}
+    - class_day:       {class, date}
+    - subject_day:     {subject, date}
+    - student:         {studentId}
+    - student_subject: {studentId, subject, class}
+    `_id` is "<kind>|<key values>" so increments are single-document upserts.
+    Date-keyed kinds only count records with a `date` field, like the
+    `{"date": day}` queries they replace (face-verified marks carry only `timestamp`).
+    """
+
+    DATE_KINDS = ("day", "class_day", "subject_day")
+
+    KINDS = {
+        "day": ("date",),
+        "class_day": ("class", "date"),
+        "subject_day": ("subject", "date"),
+        "student": ("studentId",),
+        "student_subject": ("studentId", "subject", "class"),
+    }
+
+    INDEXES = [
+        # date-range reads (reports) per kind
+        IndexModel([("kind", ASCENDING), ("date", ASCENDING)]),
+        # a student's per-subject breakdown
+        IndexModel([("kind", ASCENDING), ("studentId", ASCENDING)]),
+    ]
+
+    @staticmethod
+    def collection(db):
+        return db.attendance_rollups
+
+    @staticmethod
+    def ensure_indexes(db):
+        AttendanceRollup.collection(db).create_indexes(AttendanceRollup.INDEXES)
+
+    @staticmethod
+    def make_id(kind, fields):
+        return "|".join([kind] + ["" if fields.get(f) is None else str(fields[f]) for f in AttendanceRollup.KINDS[kind]])
+
+    @staticmethod
+    def keys_for(doc):
+        """(_id, key fields) of every counter one attendance record contributes to."""
+        values = {
+            "date": doc.get("date"),
+            "class": doc.get("class"),
+            "subject": doc.get("subject"),
+            "studentId": doc.get("studentId"),
+        }
+        out = []
+        for kind, names in AttendanceRollup.KINDS.items():
+            if kind in AttendanceRollup.DATE_KINDS and not values["date"]:
+                continue
+            fields = {"kind": kind, **{n: values[n] for n in names}}
+            out.append((AttendanceRollup.make_id(kind, fields), fields))
+        return out
@@ -0,0 +1,104 @@
+"""Index bootstrap for all models, plus the query shapes the routes run (for explain checks)."""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bson import ObjectId
+
+from app.models.attendance import Attendance
+from app.models.attendance_rollup import AttendanceRollup
+from app.models.session import Session
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+MODELS = (User, Session, Attendance, AttendanceRollup)
+
+_SAMPLE_ID = ObjectId()
+_SAMPLE_DATE = "2024-01-01"
+_SAMPLE_SINCE = datetime.utcnow() - timedelta(minutes=1)
+_LIST_SORT = [("date", -1), ("time", -1), ("_id", -1)]
+
+# (name, model, filter, sort, limit) for every hot query in app/routes and app/services.
+QUERY_SHAPES = [
+    ("auth.login", User, {"email": "user@example.com"}, None, 1),
+    ("admin.list_faculty", User, {"role": User.ROLE_FACULTY}, [("name", 1)], 0),
+    ("admin.list_students", User, {"role": User.ROLE_STUDENT}, [("name", 1)], 0),
+    ("admin.stats.count_role", User, {"role": User.ROLE_STUDENT}, None, 0),
+    ("faculty.get_session.total_students", User, {"role": User.ROLE_STUDENT, "class": "CSE-A"}, None, 0),
+    ("gallery.full_load", User, {"faceRegistered": True}, None, 0),
+    ("gallery.delta_sync.registered", User, {"faceRegisteredAt": {"$gte": _SAMPLE_SINCE}, "faceRegistered": {"$in": [True, False]}}, None, 0),
+    ("gallery.delta_sync.updated", User, {"updatedAt": {"$gte": _SAMPLE_SINCE}, "faceRegistered": {"$in": [True, False]}}, None, 0),
+    ("sessions.active", Session, {"endTime": None}, [("startTime", -1)], 20),
+    ("faculty.list_sessions", Session, {"facultyId": str(_SAMPLE_ID)}, [("startTime", -1)], 50),
+    ("faculty.get_session", Session, {"sessionId": "sid", "facultyId": str(_SAMPLE_ID)}, None, 1),
+    ("face.verify.session", Session, {"sessionId": "sid"}, None, 1),
+    ("face.verify.present_set", Attendance, {"sessionId": "sid"}, None, 0),
+    ("face.verify.already_marked", Attendance, {"sessionId": "sid", "studentId": str(_SAMPLE_ID)}, None, 1),
+    ("faculty.session_attendance", Attendance, {"sessionId": "sid"}, None, 0),
+    ("student.me.rollup", AttendanceRollup, {"kind": "student_subject", "studentId": str(_SAMPLE_ID)}, None, 0),
+    ("attendance.list.student", Attendance, {"studentId": str(_SAMPLE_ID)}, _LIST_SORT, 200),
+    ("attendance.list.all", Attendance, {}, _LIST_SORT, 200),
+    ("attendance.list.range", Attendance, {"date": {"$gte": _SAMPLE_DATE, "$lte": _SAMPLE_DATE}},
+     _LIST_SORT, 200),
+    ("attendance.list.class", Attendance, {"class": "CSE-A"}, _LIST_SORT, 200),
+    ("attendance.list.next_page", Attendance,
+     {"$or": [{"date": {"$lt": _SAMPLE_DATE}}, {"date": None},
+              {"date": _SAMPLE_DATE, "time": {"$lt": "12:00:00"}}, {"date": _SAMPLE_DATE, "time": None},
+              {"date": _SAMPLE_DATE, "time": "12:00:00", "_id": {"$lt": _SAMPLE_ID}}]},
+     _LIST_SORT, 200),
+    ("admin.reports.today", AttendanceRollup, {"_id": f"day|{_SAMPLE_DATE}"}, None, 1),
+]
+
+
+def ensure_all_indexes(db) -> Dict[str, str]:
+    """Create every model's declared indexes; a failing collection is reported, not fatal."""
+    results = {}
+    for model in MODELS:
+        name = model.collection(db).name
+        try:
+            model.ensure_indexes(db)
+            results[name] = "ok"
+        except Exception as ex:
+            # e.g. existing duplicates blocking a unique index; dedupe them, then rerun.
+            logger.warning("Index creation failed for %s: %s", name, ex)
+            results[name] = f"error: {ex}"
+    return results
+
+
+def _plan_stages(plan) -> List[str]:
+    stages = []
+    while isinstance(plan, dict):
+        if plan.get("stage"):
+            stages.append(plan["stage"])
+        for child in plan.get("inputStages", []):
+            stages.extend(_plan_stages(child))
+        plan = plan.get("inputStage") or plan.get("queryPlan")
+    return stages
+
+
+def explain_query_shapes(db) -> List[Dict]:
+    """
+    Run explain() on every QUERY_SHAPES entry. Each report lists the winning plan's stages
+    and flags COLLSCAN (no usable index) and SORT (in-memory sort).
+    """
+    reports = []
+    for name, model, query, sort, limit in QUERY_SHAPES:
+        cursor = model.collection(db).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        try:
+            winning = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+            stages = _plan_stages(winning)
+            reports.append({
+                "query": name,
+                "collection": model.collection(db).name,
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages,
+                "inMemorySort": "SORT" in stages,
+            })
+        except Exception as ex:
+            reports.append({"query": name, "collection": model.collection(db).name, "error": str(ex)})
+    return reports
@@ -1,14 +1,27 @@
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 
 class Session:
     MODE_WEBCAM = "webcam"
     MODE_MOBILE = "mobile"
 
+    INDEXES = [
+        IndexModel([("sessionId", ASCENDING)], unique=True),
+        # faculty session list, newest first
+        IndexModel([("facultyId", ASCENDING), ("startTime", DESCENDING)]),
+        # active sessions (endTime: null), newest first
+        IndexModel([("endTime", ASCENDING), ("startTime", DESCENDING)]),
+    ]
+
     @staticmethod
     def collection(db):
         return db.sessions
 
+    @staticmethod
+    def ensure_indexes(db):
+        Session.collection(db).create_indexes(Session.INDEXES)
+
     @staticmethod
     def to_json(doc):
         if not doc:
@@ -1,5 +1,6 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 
 class User:
@@ -7,13 +8,24 @@ class User:
     ROLE_FACULTY = "faculty"
     ROLE_STUDENT = "student"
 
+    INDEXES = [
+        IndexModel([("email", ASCENDING)], unique=True),
+        # admin faculty/student lists (sorted by name) and role counts
+        IndexModel([("role", ASCENDING), ("name", ASCENDING)]),
+        # class rosters: totalStudents per session, class-scoped galleries
+        IndexModel([("role", ASCENDING), ("class", ASCENDING)]),
+        # gallery load and the two branches of the delta-sync $or
+        IndexModel([("faceRegistered", ASCENDING), ("faceRegisteredAt", DESCENDING)]),
+        IndexModel([("faceRegistered", ASCENDING), ("updatedAt", DESCENDING)]),
+    ]
+
     @staticmethod
     def collection(db):
         return db.users
 
     @staticmethod
     def ensure_indexes(db):
-        User.collection(db).create_index("email", unique=True)
+        User.collection(db).create_indexes(User.INDEXES)
 
     @staticmethod
     def to_json(doc):
@@ -22,5 +34,10 @@ class User:
         doc["id"] = str(doc["_id"])
         doc.pop("_id", None)
         doc.pop("password", None)
-        doc.pop("faceEncoding", None)  # never expose encoding to client
+        # never expose encodings to the client
+        for field in ("faceEncoding", "embedding", "embeddings", "embeddingPrototypes"):
+            doc.pop(field, None)
+        # duplicate-face review names other users; only say that a review is pending
+        if doc.pop("faceDuplicateReview", None):
+            doc["faceDuplicateFlagged"] = True
         return doc
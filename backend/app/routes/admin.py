@@ -3,7 +3,7 @@ import bcrypt
 from bson import ObjectId
 from app.extensions import get_mongo, require_auth
 from app.models.user import User
-from app.models.attendance import Attendance
+from app.services.attendance_service import day_attendance_count
 from datetime import datetime, timedelta
 
 bp = Blueprint("admin", __name__)
@@ -13,6 +13,19 @@ def _settings_collection(db):
     return db.settings
 
 
+def _sync_face_gallery(db, upsert=None, remove_id=None):
+    """Keep the recognizer's in-memory gallery (and snapshot version) in step with user edits/deletes."""
+    try:
+        from app.services.face_recognition_simple import get_recognizer
+        recognizer = get_recognizer()
+        if upsert is not None:
+            recognizer.upsert_user(upsert, db=db)
+        if remove_id is not None:
+            recognizer.remove_user(remove_id, db=db)
+    except Exception:
+        pass
+
+
 @bp.route("/faculty", methods=["GET"])
 @require_auth(roles=["admin"])
 def list_faculty():
@@ -92,6 +105,7 @@ def delete_faculty(faculty_id):
     result = User.collection(db).delete_one({"_id": oid, "role": User.ROLE_FACULTY})
     if result.deleted_count == 0:
         return jsonify({"error": "Faculty not found"}), 404
+    _sync_face_gallery(db, remove_id=faculty_id)
     return jsonify({"message": "Deleted"})
 
 
@@ -162,8 +176,11 @@ def update_student(student_id):
         updates["password"] = bcrypt.hashpw(data["password"].encode("utf-8"), bcrypt.gensalt())
 
     if updates:
+        updates["updatedAt"] = datetime.utcnow()
         User.collection(db).update_one({"_id": oid}, {"$set": updates})
     updated = User.collection(db).find_one({"_id": oid})
+    if updates and updated and updated.get("faceRegistered"):
+        _sync_face_gallery(db, upsert=updated)
     return jsonify({"student": User.to_json(updated)})
 
 
@@ -178,6 +195,7 @@ def delete_student(student_id):
     result = User.collection(db).delete_one({"_id": oid, "role": User.ROLE_STUDENT})
     if result.deleted_count == 0:
         return jsonify({"error": "Student not found"}), 404
+    _sync_face_gallery(db, remove_id=student_id)
     return jsonify({"message": "Deleted"})
 
 
@@ -213,7 +231,7 @@ def reports():
     today = datetime.utcnow().date().isoformat()
     total_faculty = User.collection(db).count_documents({"role": User.ROLE_FACULTY})
     total_students = User.collection(db).count_documents({"role": User.ROLE_STUDENT})
-    today_attendance = Attendance.collection(db).count_documents({"date": today})
+    today_attendance = day_attendance_count(db, today)
     doc = _settings_collection(db).find_one({"key": "global"})
     mobile_gps = doc.get("mobileGpsEnabled", False) if doc else False
     return jsonify({
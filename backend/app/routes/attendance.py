@@ -1,16 +1,52 @@
-from flask import Blueprint, request, jsonify
+import base64
+import csv
+import io
+import json
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from app.extensions import get_mongo, require_auth
 from app.models.attendance import Attendance
-from app.models.session import Session
 
 bp = Blueprint("attendance", __name__)
 
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+LIST_SORT = [("date", -1), ("time", -1), ("_id", -1)]
+CSV_FIELDS = ["date", "time", "studentName", "studentId", "subject", "class", "mode", "sessionId"]
 
-@bp.route("", methods=["GET"])
-@require_auth(roles=["admin", "faculty", "student"])
-def list_attendance():
-    db = get_mongo()
-    user = request.current_user
+
+def _encode_cursor(doc) -> str:
+    key = {"d": doc.get("date"), "t": doc.get("time"), "i": str(doc["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(token: str) -> dict:
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    key = json.loads(raw)
+    return {"date": key["d"], "time": key["t"], "_id": ObjectId(key["i"])}
+
+
+def _after_cursor(key: dict) -> dict:
+    """
+    Keyset condition for "strictly after `key`" in LIST_SORT (all descending) order.
+    Missing date/time sort as null, the lowest value, after every real one; "$lt" never
+    matches null, so those rows need their own equality branches.
+    """
+    branches = []
+    if key["date"] is not None:
+        branches.append({"date": {"$lt": key["date"]}})
+        branches.append({"date": None})
+    if key["time"] is not None:
+        branches.append({"date": key["date"], "time": {"$lt": key["time"]}})
+        branches.append({"date": key["date"], "time": None})
+    branches.append({"date": key["date"], "time": key["time"], "_id": {"$lt": key["_id"]}})
+    return {"$or": branches}
+
+
+def _list_query(user) -> dict:
     role = user.get("role")
     date_from = request.args.get("dateFrom")
     date_to = request.args.get("dateTo")
@@ -31,9 +67,74 @@ def list_attendance():
         query["class"] = class_name
     if subject:
         query["subject"] = subject
+    return query
+
+
+def _export(cursor, fmt: str):
+    """Stream documents straight off the Mongo cursor; memory stays at one batch."""
+    if fmt == "csv":
+        def rows():
+            buf = io.StringIO()
+            writer = csv.DictWriter(buf, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            for doc in cursor:
+                writer.writerow({k: doc.get(k, "") for k in CSV_FIELDS})
+                if buf.tell() >= 64 * 1024:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+            yield buf.getvalue()
+
+        mimetype, ext = "text/csv", "csv"
+    else:
+        def rows():
+            for doc in cursor:
+                yield json.dumps(Attendance.to_json(doc), default=str) + "\n"
+
+        mimetype, ext = "application/x-ndjson", "ndjson"
+
+    return Response(
+        stream_with_context(rows()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=attendance.{ext}"},
+    )
+
+
+@bp.route("", methods=["GET"])
+@require_auth(roles=["admin", "faculty", "student"])
+def list_attendance():
+    """
+    Attendance records, newest first, keyset-paginated on (date, time, _id).
+    - ?limit=N (max 1000) and ?cursor=<nextCursor from the previous page>
+    - ?format=ndjson|csv streams every matching record (no page limit) as a download
+    """
+    db = get_mongo()
+    query = _list_query(request.current_user)
+
+    token = request.args.get("cursor")
+    if token:
+        try:
+            query = {"$and": [query, _after_cursor(_decode_cursor(token))]}
+        except (ValueError, KeyError, TypeError, InvalidId):
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    fmt = (request.args.get("format") or "json").lower()
+    if fmt in ("ndjson", "csv"):
+        cursor = Attendance.collection(db).find(query).sort(LIST_SORT).batch_size(EXPORT_BATCH_SIZE)
+        return _export(cursor, fmt)
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
 
-    attendances = list(Attendance.collection(db).find(query).sort("date", -1).sort("time", -1).limit(200))
-    return jsonify({"attendances": [Attendance.to_json(a) for a in attendances]})
+    # One extra row tells us whether another page exists.
+    attendances = list(Attendance.collection(db).find(query).sort(LIST_SORT).limit(limit + 1))
+    next_cursor = _encode_cursor(attendances[limit - 1]) if len(attendances) > limit else None
+    return jsonify({
+        "attendances": [Attendance.to_json(a) for a in attendances[:limit]],
+        "nextCursor": next_cursor,
+    })
 
 
 @bp.route("/mark", methods=["POST"])
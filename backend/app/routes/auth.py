@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 import bcrypt
 from bson import ObjectId
+from datetime import datetime
 from app.extensions import get_mongo, create_jwt_token, require_auth
 from app.models.user import User
 
@@ -49,6 +50,7 @@ def register_own_face():
     """Student/Faculty registers their own face. One face per user."""
     from app.services.face_service import FaceService
     from app.services.supabase_storage import upload_face_image
+    from app.services.embedding_codec import embedding_update
 
     if "image" not in request.files and not request.get_json():
         return jsonify({"error": "Image required"}), 400
@@ -89,15 +91,16 @@ def register_own_face():
 
     # Upload to Supabase and save URL
     url = upload_face_image(image_bytes, f"{user_id}_{user['email'].replace('@', '_')}.jpg")
+    to_set, to_unset = embedding_update(result["encoding"])
+    to_set.update({"faceRegistered": True, "faceRegisteredAt": datetime.utcnow()})
     if url:
-        User.collection(db).update_one(
-            {"_id": user["_id"]},
-            {"$set": {"faceEncoding": result["encoding"], "faceRegistered": True, "supabaseImageUrl": url}}
-        )
-    else:
-        User.collection(db).update_one(
-            {"_id": user["_id"]},
-            {"$set": {"faceEncoding": result["encoding"], "faceRegistered": True}}
-        )
+        to_set["supabaseImageUrl"] = url
+    User.collection(db).update_one({"_id": user["_id"]}, {"$set": to_set, "$unset": to_unset})
 
-    return jsonify({"message": "Face registered successfully", "user": User.to_json(User.collection(db).find_one({"_id": user["_id"]}))})
+    updated = User.collection(db).find_one({"_id": user["_id"]})
+    try:
+        from app.services.face_recognition_simple import get_recognizer
+        get_recognizer().upsert_user(updated, db=db)
+    except Exception:
+        pass
+    return jsonify({"message": "Face registered successfully", "user": User.to_json(updated)})
@@ -1,32 +1,54 @@
 import base64
 import binascii
+import json
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
 import cv2
 import numpy as np
 from bson import ObjectId
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, g, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
 
-from app.extensions import get_mongo, require_auth
+from app.config import Config
+from app.extensions import decode_jwt_token, get_mongo, mongo_pool_stats, require_auth
 from app.models.attendance import Attendance
-from app.models.session import Session
 from app.models.user import User
+from app.services.attendance_service import attendance_writer, present_students
+from app.services.embedding_codec import embedding_update
 from app.services.face_recognition_simple import get_recognizer
+from app.services.face_tracker import bbox_iou
+from app.services.frame_pipeline import PreparedFrame, prepare_frame
 from app.services.ml_service import ml_service
 
+try:
+    from flask_sock import Sock
+except ImportError:  # optional: /stream is only served when flask-sock is installed
+    Sock = None
+
 bp = Blueprint("face", __name__)
 logger = logging.getLogger(__name__)
+sock = Sock() if Sock is not None else None
 
 registration_sessions = {}
 liveness_sessions = {}
 SESSION_TTL_MINUTES = 10
 MIN_ACCEPTED_FRAMES = 6
+EARLY_DUPLICATE_CHECK_FRAMES = 3    # accepted frames before the first gallery-wide duplicate check
 DATASET_DIR = Path(__file__).resolve().parents[2] / "datasets"
 LIVENESS_FREEZE_DIFF = 1.0
 LIVENESS_FREEZE_FRAMES = 4
 LIVENESS_TTL_SECONDS = 90
+FRAME_CONTENT_TYPES = ("image/jpeg", "image/png", "image/webp", "application/octet-stream")
+FRAME_FIELDS_SLACK = 4096           # JSON keys/fields around a base64 frame
+B64_CALIBRATION_BYTES = 256 * 1024
+B64_COST_SMOOTHING = 0.2
+STREAM_ROLES = ("faculty", "admin")
+STREAM_IDLE_TIMEOUT_SECONDS = 60
 
 
 def read_image_from_base64(base64_string):
@@ -37,26 +59,6 @@ def read_image_from_base64(base64_string):
     return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
 
-def _bbox_iou(a, b):
-    if not a or not b:
-        return 0.0
-    ax1, ay1, aw, ah = a["x"], a["y"], a["w"], a["h"]
-    bx1, by1, bw, bh = b["x"], b["y"], b["w"], b["h"]
-    ax2, ay2 = ax1 + aw, ay1 + ah
-    bx2, by2 = bx1 + bw, by1 + bh
-
-    ix1, iy1 = max(ax1, bx1), max(ay1, by1)
-    ix2, iy2 = min(ax2, bx2), min(ay2, by2)
-    iw, ih = max(0, ix2 - ix1), max(0, iy2 - iy1)
-    inter = iw * ih
-    if inter <= 0:
-        return 0.0
-
-    a_area = max(1, aw * ah)
-    b_area = max(1, bw * bh)
-    return float(inter / max(1.0, a_area + b_area - inter))
-
-
 def _is_valid_session(session, current_user_id):
     if not session:
         return False, "Invalid session"
@@ -67,6 +69,38 @@ def _is_valid_session(session, current_user_id):
     return True, ""
 
 
+def _mean_embedding(vectors: np.ndarray) -> np.ndarray:
+    vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9)
+    avg = np.mean(vectors, axis=0)
+    return avg / (np.linalg.norm(avg) + 1e-9)
+
+
+def _registration_conflicts(db, session, user_id):
+    """Other users whose stored prototypes match this enrollment's mean embedding."""
+    vectors = np.array(session["embeddings"]["Facenet512"], dtype=np.float32)
+    conflicts = get_recognizer().identity_conflicts(
+        db,
+        _mean_embedding(vectors),
+        Config.FACE_DUPLICATE_THRESHOLD,
+        Config.FACE_DUPLICATE_TOP_K,
+        exclude_user_id=user_id,
+    )
+    if conflicts:
+        logger.warning("Duplicate face during registration of user %s: %s", user_id, conflicts)
+    return conflicts
+
+
+def _duplicate_rejected(session_id):
+    registration_sessions.pop(session_id, None)
+    return jsonify(
+        {
+            "success": False,
+            "error": "This face is already registered to another user",
+            "reason": "duplicate_identity",
+        }
+    )
+
+
 def _cleanup_liveness_cache(now):
     stale_keys = []
     for key, state in liveness_sessions.items():
@@ -80,14 +114,12 @@ def _cleanup_liveness_cache(now):
         liveness_sessions.pop(key, None)
 
 
-def _assess_liveness(image_bytes: bytes, session_id: str, user_id: str):
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+def _assess_liveness(frame: PreparedFrame, session_id: str, user_id: str):
     if frame is None:
         return "unknown", 0.0
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    small = cv2.resize(gray, (48, 48), interpolation=cv2.INTER_AREA)
+    # The 48x48 thumbnail comes from the frame the recognizer already decoded.
+    small = frame.thumbnail
 
     now = datetime.utcnow()
     _cleanup_liveness_cache(now)
@@ -114,6 +146,166 @@ def _assess_liveness(image_bytes: bytes, session_id: str, user_id: str):
     return ("fake" if is_fake else "real"), round(motion_score, 3)
 
 
+# CPU cost of the base64 path (JSON parse + b64decode, ns per encoded character): measured
+# once on a synthetic frame, then tracked on real base64 uploads. Binary uploads report
+# what parsing the same frame as base64 would have cost.
+_b64_cost = {"nsPerChar": None}
+_upload_totals = {}
+_upload_lock = threading.Lock()
+
+
+def _b64_len(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+def _b64_ns_per_char() -> float:
+    if _b64_cost["nsPerChar"] is None:
+        payload = json.dumps({"image": base64.b64encode(os.urandom(B64_CALIBRATION_BYTES)).decode("ascii")})
+        started = time.thread_time_ns()
+        base64.b64decode(json.loads(payload)["image"])
+        _b64_cost["nsPerChar"] = (time.thread_time_ns() - started) / len(payload)
+    return _b64_cost["nsPerChar"]
+
+
+def _record_b64_cost(cpu_ns: int, chars: int):
+    if chars < 1024:
+        return
+    measured = cpu_ns / chars
+    with _upload_lock:
+        known = _b64_cost["nsPerChar"]
+        _b64_cost["nsPerChar"] = measured if known is None else known + B64_COST_SMOOTHING * (measured - known)
+
+
+def _count_upload(upload: dict):
+    with _upload_lock:
+        totals = _upload_totals.setdefault(
+            upload["encoding"], {"requests": 0, "bytes": 0, "bytesSaved": 0, "cpuSavedMs": 0.0}
+        )
+        totals["requests"] += 1
+        totals["bytes"] += upload["bytes"]
+        totals["bytesSaved"] += upload["bytesSaved"]
+        totals["cpuSavedMs"] = round(totals["cpuSavedMs"] + upload["cpuSavedMs"], 3)
+
+
+def upload_stats() -> dict:
+    """Frame uploads per encoding, with the bytes and parse CPU the binary paths saved."""
+    with _upload_lock:
+        return {
+            "b64NsPerChar": None if _b64_cost["nsPerChar"] is None else round(_b64_cost["nsPerChar"], 3),
+            "byEncoding": {k: dict(v) for k, v in _upload_totals.items()},
+        }
+
+
+def _frame_too_large(mimetype: str) -> bool:
+    """Declared body over FRAME_MAX_BYTES (checked before anything is read or allocated)."""
+    limit = Config.FRAME_MAX_BYTES
+    if mimetype not in FRAME_CONTENT_TYPES:
+        limit = _b64_len(limit) + FRAME_FIELDS_SLACK
+    return (request.content_length or 0) > limit
+
+
+def _frame_too_large_response():
+    return jsonify({"error": "Frame too large", "maxBytes": Config.FRAME_MAX_BYTES}), 413
+
+
+def _read_request_body():
+    """Read a raw request body straight into one preallocated buffer (no intermediate copies)."""
+    length = request.content_length
+    if not length:
+        # Chunked upload: read at most one byte past the limit to detect oversize frames.
+        data = request.stream.read(Config.FRAME_MAX_BYTES + 1)
+        if len(data) > Config.FRAME_MAX_BYTES:
+            raise RequestEntityTooLarge()
+        return data
+    if length > Config.FRAME_MAX_BYTES:
+        raise RequestEntityTooLarge()
+    buf = bytearray(length)
+    view = memoryview(buf)
+    read = 0
+    while read < length:
+        n = request.stream.readinto(view[read:])
+        if not n:
+            break
+        read += n
+    return buf if read == length else buf[:read]
+
+
+def _flag(fields, name: str, default: bool) -> bool:
+    value = fields.get(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "no", "")
+    return bool(value)
+
+
+def _frame_payload():
+    """
+    Frame bytes + request fields for /verify and /recognize, from any supported upload:
+    - raw image body (Content-Type image/jpeg etc.), fields in the query string
+    - multipart/form-data with an `image` file, fields in the form
+    - JSON with a base64 (optionally data-URL) `image`
+    Returns (image_bytes, fields); image_bytes is None if missing, b"" if undecodable.
+    """
+    started = time.perf_counter()
+    mimetype = request.mimetype
+    if _frame_too_large(mimetype):
+        raise RequestEntityTooLarge()
+    parse_ns = None
+    if mimetype in FRAME_CONTENT_TYPES:
+        encoding, fields = "binary", request.args
+        image_bytes = _read_request_body() or None
+    elif mimetype == "multipart/form-data":
+        encoding, fields = "multipart", request.form
+        image_file = request.files.get("image")
+        image_bytes = image_file.read() if image_file else None
+    else:
+        encoding = "base64"
+        body = request.get_data(cache=True)
+        cpu_started = time.thread_time_ns()
+        fields = request.get_json(silent=True) or {}
+        image_b64 = fields.get("image")
+        image_bytes = None
+        if image_b64 and isinstance(image_b64, str):
+            if "," in image_b64:
+                image_b64 = image_b64.split(",")[1]
+            try:
+                image_bytes = base64.b64decode(image_b64)
+            except (binascii.Error, ValueError):
+                image_bytes = b""
+        parse_ns = time.thread_time_ns() - cpu_started
+        _record_b64_cost(parse_ns, len(body))
+
+    size = len(image_bytes) if image_bytes else 0
+    g.frame_upload = {
+        "encoding": encoding,
+        "bytes": size,
+        # What the same frame would have cost as base64 text, in bytes and in parse CPU.
+        "bytesSaved": 0 if encoding == "base64" else _b64_len(size) - size,
+        "cpuSavedMs": 0.0 if encoding == "base64" or not size else _b64_ns_per_char() * _b64_len(size) / 1e6,
+        "parseMs": None if parse_ns is None else parse_ns / 1e6,
+        "uploadMs": (time.perf_counter() - started) * 1000.0,
+        "started": started,
+    }
+    _count_upload(g.frame_upload)
+    return image_bytes, fields
+
+
+@bp.after_request
+def _frame_timing_headers(response):
+    upload = g.pop("frame_upload", None)
+    if upload is not None:
+        total_ms = (time.perf_counter() - upload["started"]) * 1000.0
+        timing = [f'upload;dur={upload["uploadMs"]:.2f};desc="{upload["encoding"]}"']
+        if upload["parseMs"] is not None:
+            timing.append(f'b64parse;dur={upload["parseMs"]:.2f};desc="json+b64decode CPU"')
+        timing.append(f"total;dur={total_ms:.2f}")
+        response.headers["Server-Timing"] = ", ".join(timing)
+        response.headers["X-Frame-Encoding"] = upload["encoding"]
+        response.headers["X-Frame-Bytes"] = str(upload["bytes"])
+        response.headers["X-Frame-Bytes-Saved"] = str(upload["bytesSaved"])
+        response.headers["X-Frame-CPU-Saved-Ms"] = f'{upload["cpuSavedMs"]:.3f}'
+    return response
+
+
 @bp.route("/register/start", methods=["POST"])
 @require_auth(roles=["student", "faculty"])
 def start_register():
@@ -165,8 +357,7 @@ def register_frame():
         if not image_file:
             return jsonify({"success": False, "error": "No image", "reason": "no_image"}), 200
 
-        file_bytes = np.frombuffer(image_file.read(), np.uint8)
-        img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        img = prepare_frame(image_file.read())
         if img is None:
             return jsonify({"success": False, "error": "Invalid image", "reason": "invalid_image"}), 200
 
@@ -201,7 +392,7 @@ def register_frame():
                 }
             ), 200
 
-        if session["last_bbox"] is not None and _bbox_iou(session["last_bbox"], bbox) > 0.97:
+        if session["last_bbox"] is not None and bbox_iou(session["last_bbox"], bbox) > 0.97:
             return jsonify(
                 {
                     "success": False,
@@ -235,16 +426,24 @@ def register_frame():
         session["last_bbox"] = bbox
         session["last_embedding"] = embedding
 
+        # Fail fast: check for an existing identity once a few frames are in. In "flag" mode
+        # nothing is rejected, so the check waits for complete_register.
+        if (Config.FACE_DUPLICATE_ACTION == "reject"
+                and session["accepted_count"] == EARLY_DUPLICATE_CHECK_FRAMES
+                and _registration_conflicts(get_mongo(), session, current_user_id)):
+            return _duplicate_rejected(session_id), 409
+
         # Save accepted cropped face sample in-memory; persisted to dataset on complete.
         if bbox:
-            x, y, w, h = int(bbox["x"]), int(bbox["y"]), int(bbox["w"]), int(bbox["h"])
+            # bbox is in uploaded-image pixels; the frame may have been decoded at reduced size.
+            x, y, w, h = img.from_source(bbox)
             pad = int(max(w, h) * 0.22)
             ih, iw = img.shape[:2]
             x1 = max(0, x - pad)
             y1 = max(0, y - pad)
             x2 = min(iw, x + w + pad)
             y2 = min(ih, y + h + pad)
-            face_crop = img[y1:y2, x1:x2]
+            face_crop = img.image[y1:y2, x1:x2]
             if face_crop.size > 0:
                 face_crop = cv2.resize(face_crop, (224, 224))
                 ok_enc, jpg = cv2.imencode(".jpg", face_crop, [int(cv2.IMWRITE_JPEG_QUALITY), 92])
@@ -296,31 +495,30 @@ def complete_register():
         if len(vectors.shape) != 2 or vectors.shape[0] == 0:
             return jsonify({"success": False, "error": "No embeddings captured"}), 400
 
-        norms = np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9
-        vectors = vectors / norms
-        avg = np.mean(vectors, axis=0)
-        avg = avg / (np.linalg.norm(avg) + 1e-9)
-        final_embedding = avg.tolist()
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9)
+        avg = _mean_embedding(vectors)
         # Keep multiple prototypes for robust real-time matching.
         max_prototypes = 20
         step = max(1, len(vectors) // max_prototypes)
-        prototypes = [vectors[i].tolist() for i in range(0, len(vectors), step)][:max_prototypes]
+        prototypes = vectors[::step][:max_prototypes]
 
         db = get_mongo()
-        user_oid = ObjectId(current_user_id)
-        update_doc = {
-            "embeddings": {"Facenet512": final_embedding},
-            "embedding": final_embedding,
-            "embeddingPrototypes": prototypes,
-            "faceEncoding": final_embedding,
-            "faceRegistered": True,
-            "faceRegisteredAt": datetime.utcnow(),
-        }
-        User.collection(db).update_one({"_id": user_oid}, {"$set": update_doc})
+        conflicts = _registration_conflicts(db, session, current_user_id)
+        if conflicts and Config.FACE_DUPLICATE_ACTION == "reject":
+            return _duplicate_rejected(session_id), 409
 
-        # Recognition service caches DB for a few minutes; invalidate so new face works immediately.
+        user_oid = ObjectId(current_user_id)
+        update_doc, to_unset = embedding_update(avg, prototypes)
+        update_doc.update({"faceRegistered": True, "faceRegisteredAt": datetime.utcnow()})
+        if conflicts:
+            update_doc["faceDuplicateReview"] = {"conflicts": conflicts, "flaggedAt": datetime.utcnow()}
+        else:
+            to_unset["faceDuplicateReview"] = ""
+        User.collection(db).update_one({"_id": user_oid}, {"$set": update_doc, "$unset": to_unset})
+
+        # Patch this user into the in-memory gallery so the new face works immediately.
         try:
-            get_recognizer().invalidate_cache()
+            get_recognizer().upsert_user(User.collection(db).find_one({"_id": user_oid}), db=db)
         except Exception:
             pass
 
@@ -343,6 +541,7 @@ def complete_register():
                 "minRequired": min_required,
                 "datasetPath": str(user_dataset_dir),
                 "datasetCount": len(session.get("samples", [])),
+                "flaggedForReview": bool(conflicts),
             }
         ), 200
     except Exception as e:
@@ -353,12 +552,13 @@ def complete_register():
 @bp.route("/recognize", methods=["POST"])
 def recognize_face():
     try:
-        data = request.get_json(silent=True) or {}
-        image_data = data.get("image")
-        if not image_data:
+        image_bytes, _ = _frame_payload()
+        if not image_bytes:
             return jsonify({"error": "Missing image"}), 400
 
-        img = read_image_from_base64(image_data)
+        img = prepare_frame(image_bytes)
+        if img is None:
+            return jsonify({"error": "Invalid image"}), 400
         result = ml_service.generate_embedding(img)
 
         if result is None:
@@ -371,34 +571,170 @@ def recognize_face():
                 "bbox": result.get("bbox"),
             }
         ), 200
+    except RequestEntityTooLarge:
+        return _frame_too_large_response()
     except Exception as e:
         logger.error("Recognition Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+def _mark_verified_face(db, session_id: str, result: dict, frame: PreparedFrame, auto_mark: bool) -> dict:
+    """Liveness check + attendance marking for one recognized face; returns its verify payload."""
+    user_data = {
+        "id": str(result["user_id"]),
+        "name": result["name"],
+        "rollNo": result.get("rollNo", ""),
+        "confidence": result["confidence"],
+    }
+    if present_students.contains(db, session_id, user_data["id"]):
+        # Already present: no liveness check or attendance lookup, and the tracker keeps this face locked.
+        get_recognizer().pin_present(session_id, user_data["id"])
+        return {
+            "matched": True,
+            "user": user_data,
+            "confidence": result["confidence"],
+            "attendanceMarked": False,
+            "alreadyMarked": True,
+            "bbox": result.get("bbox"),
+            "faces_detected": 1,
+            "livenessStatus": "skipped",
+            "motionScore": None,
+        }
+
+    liveness_status, motion_score = _assess_liveness(
+        frame=frame,
+        session_id=session_id,
+        user_id=user_data["id"],
+    )
+
+    already_marked = False
+    attendance_marked = False
+
+    if auto_mark and liveness_status == "real" and result["confidence"] >= 50:
+        # One buffered upsert; a record that already existed comes back as not inserted.
+        try:
+            attendance_marked = attendance_writer.mark(
+                db,
+                {
+                    "sessionId": session_id,
+                    "studentId": user_data["id"],
+                    "timestamp": datetime.utcnow(),
+                    "status": "present",
+                    "confidence": result["confidence"],
+                },
+            )
+            already_marked = not attendance_marked
+        except Exception as ex:
+            logger.warning("Failed to mark attendance: %s", ex)
+    else:
+        existing = Attendance.collection(db).find_one({"sessionId": session_id, "studentId": user_data["id"]})
+        already_marked = existing is not None
+
+    if already_marked or attendance_marked:
+        present_students.add(db, session_id, user_data["id"])
+        get_recognizer().pin_present(session_id, user_data["id"])
+
+    return {
+        "matched": True,
+        "user": user_data,
+        "confidence": result["confidence"],
+        "attendanceMarked": attendance_marked,
+        "alreadyMarked": already_marked,
+        "bbox": result.get("bbox"),
+        "faces_detected": 1,
+        "livenessStatus": liveness_status,
+        "motionScore": motion_score,
+    }
+
+
+def _unmatched_face(result: dict) -> dict:
+    return {
+        "matched": False,
+        "user": None,
+        "attendanceMarked": False,
+        "alreadyMarked": False,
+        "confidence": result.get("confidence", 0),
+        "bbox": result.get("bbox"),
+        "faces_detected": 1,
+    }
+
+
+def _verify_multi_face(recognizer, db, session_id, session_obj, frame, auto_mark):
+    """
+    multiFace mode: recognize and mark every student in the frame in one request.
+    Top-level fields describe the most confident face (same shape as single-face mode);
+    `faces` holds one payload per detected face.
+    """
+    results = recognizer.recognize_faces(
+        frame,
+        db,
+        session_id=session_id,
+        class_name=session_obj.get("class") if session_obj else None,
+    )
+    if any(r.get("matched") for r in results) and not session_obj:
+        return jsonify({"error": "Session not found"}), 404
+
+    faces = [
+        _mark_verified_face(db, session_id, r, frame, auto_mark) if r.get("matched") else _unmatched_face(r)
+        for r in results
+    ]
+    if faces:
+        best = max(faces, key=lambda f: (f["matched"], f.get("confidence") or 0))
+        out = dict(best)
+    else:
+        out = {"matched": False, "user": None, "attendanceMarked": False, "alreadyMarked": False}
+    out.update(
+        {
+            "faces": faces,
+            "faces_detected": len(faces),
+            "markedCount": sum(1 for f in faces if f["attendanceMarked"]),
+        }
+    )
+    return jsonify(out), 200
+
+
 @bp.route("/verify", methods=["POST"])
 def verify_face():
     try:
-        data = request.get_json(silent=True) or {}
+        image_bytes, data = _frame_payload()
         session_id = data.get("sessionId")
-        image_b64 = data.get("image")
-        auto_mark = data.get("autoMark", True)
+        auto_mark = _flag(data, "autoMark", True)
 
-        if not session_id or not image_b64 or not isinstance(image_b64, str):
+        if not session_id or image_bytes is None:
             return jsonify({"error": "Session ID and image required"}), 400
-
-        if "," in image_b64:
-            image_b64 = image_b64.split(",")[1]
-
-        try:
-            image_bytes = base64.b64decode(image_b64)
-        except (binascii.Error, ValueError):
+        if not image_bytes:
             return jsonify({"error": "Invalid image payload"}), 400
+        db = get_mongo()
+        # Checked before any per-session state (trackers, present sets) is created for the id.
+        session_obj = present_students.session(db, session_id)
+        if not session_obj or session_obj.get("endTime"):
+            return jsonify({"error": "Session not found or already ended"}), 404
+        # Decoded once; recognition, liveness and quality checks all reuse it.
+        frame = prepare_frame(image_bytes)
 
         recognizer = get_recognizer()
-        db = get_mongo()
+        if _flag(data, "multiFace", False):
+            try:
+                return _verify_multi_face(recognizer, db, session_id, session_obj, frame, auto_mark)
+            except Exception as ex:
+                logger.error("Multi-face recognizer failed: %s", ex)
+                return jsonify(
+                    {
+                        "matched": False,
+                        "user": None,
+                        "attendanceMarked": False,
+                        "alreadyMarked": False,
+                        "faces": [],
+                        "faces_detected": 0,
+                    }
+                ), 200
         try:
-            result = recognizer.recognize_face(image_bytes, db)
+            result = recognizer.recognize_face(
+                frame,
+                db,
+                session_id=session_id,
+                class_name=session_obj.get("class") if session_obj else None,
+            )
         except Exception as ex:
             logger.error("Recognizer failed: %s", ex)
             return jsonify(
@@ -423,74 +759,11 @@ def verify_face():
             )
 
         if not result.get("matched"):
-            return jsonify(
-                {
-                    "matched": False,
-                    "user": None,
-                    "attendanceMarked": False,
-                    "alreadyMarked": False,
-                    "confidence": result.get("confidence", 0),
-                    "bbox": result.get("bbox"),
-                    "faces_detected": 1,
-                }
-            )
-
-        user_data = {
-            "id": str(result["user_id"]),
-            "name": result["name"],
-            "rollNo": result.get("rollNo", ""),
-            "confidence": result["confidence"],
-        }
-        liveness_status, motion_score = _assess_liveness(
-            image_bytes=image_bytes,
-            session_id=session_id,
-            user_id=user_data["id"],
-        )
-
-        session_obj = Session.collection(db).find_one({"sessionId": session_id})
-        if not session_obj:
-            return jsonify({"error": "Session not found"}), 404
+            return jsonify(_unmatched_face(result))
 
-        existing = Attendance.collection(db).find_one(
-            {"sessionId": session_id, "studentId": str(result["user_id"])}
-        )
-
-        already_marked = existing is not None
-        attendance_marked = False
-
-        if auto_mark and liveness_status == "real" and not already_marked and result["confidence"] >= 50:
-            try:
-                Attendance.collection(db).insert_one(
-                    {
-                        "sessionId": session_id,
-                        "studentId": str(result["user_id"]),
-                        "timestamp": datetime.utcnow(),
-                        "status": "present",
-                        "confidence": result["confidence"],
-                    }
-                )
-
-                Session.collection(db).update_one(
-                    {"sessionId": session_id},
-                    {"$inc": {"presentCount": 1}},
-                )
-                attendance_marked = True
-            except Exception as ex:
-                logger.warning("Failed to mark attendance: %s", ex)
-
-        return jsonify(
-            {
-                "matched": True,
-                "user": user_data,
-                "confidence": result["confidence"],
-                "attendanceMarked": attendance_marked,
-                "alreadyMarked": already_marked,
-                "bbox": result.get("bbox"),
-                "faces_detected": 1,
-                "livenessStatus": liveness_status,
-                "motionScore": motion_score,
-            }
-        )
+        return jsonify(_mark_verified_face(db, session_id, result, frame, auto_mark))
+    except RequestEntityTooLarge:
+        return _frame_too_large_response()
     except Exception as e:
         logger.error("Verify error: %s", e)
         return jsonify(
@@ -503,3 +776,178 @@ def verify_face():
                 "error": "verify_failed",
             }
         ), 200
+
+
+@bp.route("/metrics", methods=["GET"])
+@require_auth(roles=["admin"])
+def face_metrics():
+    """Inference, MongoDB pool, gallery, tracking and frame-upload metrics for capacity tuning."""
+    return jsonify(
+        {
+            "inference": ml_service.batch_stats(),
+            "mongoPool": mongo_pool_stats(),
+            "gallery": get_recognizer().gallery_stats(),
+            "tracking": get_recognizer().tracking_stats(),
+            "uploads": upload_stats(),
+        }
+    ), 200
+
+
+class _LiveStream:
+    """
+    Server-side state of one live attendance stream (one WebSocket).
+    The session document and class gallery are resolved once; students already marked
+    present are answered from the shared present-set cache.
+    """
+
+    def __init__(self, db, session_obj, auto_mark: bool = True, multi_face: bool = True):
+        self.db = db
+        self.session_id = session_obj["sessionId"]
+        self.session_obj = session_obj
+        self.class_name = session_obj.get("class")
+        self.auto_mark = auto_mark
+        self.multi_face = multi_face
+        self.recognizer = get_recognizer()
+        self.recognizer.prepare_session(self.session_id, self.class_name, db)
+        self.frames = 0
+        self.dropped = 0
+
+    def active(self) -> bool:
+        """Session still open; re-checked every frame (the lookup is cached for SESSION_DOC_TTL_SECONDS)."""
+        session_obj = present_students.session(self.db, self.session_id)
+        return bool(session_obj) and not session_obj.get("endTime")
+
+    def configure(self, options: dict):
+        if "autoMark" in options:
+            self.auto_mark = bool(options["autoMark"])
+        if "multiFace" in options:
+            self.multi_face = bool(options["multiFace"])
+
+    def process(self, image_bytes: bytes) -> dict:
+        """Recognize one JPEG frame; returns the `result` event for it."""
+        started = time.perf_counter()
+        self.frames += 1
+        frame = prepare_frame(image_bytes)
+        if self.multi_face:
+            results = self.recognizer.recognize_faces(
+                frame, self.db, session_id=self.session_id, class_name=self.class_name
+            )
+        else:
+            result = self.recognizer.recognize_face(
+                frame, self.db, session_id=self.session_id, class_name=self.class_name
+            )
+            results = [result] if result else []
+
+        tracker = self.recognizer.trackers.get(self.session_id)
+        faces = [
+            _mark_verified_face(self.db, self.session_id, r, frame, self.auto_mark)
+            if r.get("matched") else _unmatched_face(r)
+            for r in results
+        ]
+
+        return {
+            "type": "result",
+            "frame": self.frames,
+            "faces": faces,
+            "faces_detected": len(faces),
+            "markedCount": sum(1 for f in faces if f["attendanceMarked"]),
+            "presentCount": present_students.count(self.db, self.session_id),
+            "dropped": self.dropped,
+            "skipRatio": tracker.stats()["skipRatio"] if tracker is not None else 0.0,
+            "latencyMs": round((time.perf_counter() - started) * 1000.0, 1),
+        }
+
+
+def _stream_user():
+    token = request.args.get("token")
+    auth_header = request.headers.get("Authorization", "")
+    if not token and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+    payload = decode_jwt_token(token) if token else None
+    if not payload or payload.get("role") not in STREAM_ROLES:
+        return None
+    return payload
+
+
+def _latest_frame(ws, frame):
+    """Drain frames that queued up while the previous one was processed; keep only the newest."""
+    dropped = 0
+    while True:
+        pending = ws.receive(timeout=0)
+        if pending is None:
+            return frame, dropped, None
+        if isinstance(pending, str):
+            return frame, dropped, pending
+        frame = pending
+        dropped += 1
+
+
+if sock is not None:
+
+    @sock.route("/stream", bp=bp)
+    def stream_verify(ws):
+        """
+        Live attendance over a WebSocket: /api/face/stream?sessionId=..&token=..
+        - Client sends binary JPEG frames, plus optional JSON text messages
+          ({"type": "config", "autoMark": bool, "multiFace": bool} or {"type": "ping"})
+        - Server sends {"type": "ready"}, then one {"type": "result"} per processed frame
+          and an {"type": "attendance"} event for every student newly marked present
+        - Frames that arrive while one is being processed are dropped in favour of the newest
+        """
+        if _stream_user() is None:
+            ws.send(json.dumps({"type": "error", "error": "Invalid or expired token"}))
+            return
+
+        db = get_mongo()
+        session_id = request.args.get("sessionId")
+        session_obj = present_students.session(db, session_id) if session_id else None
+        if not session_obj or session_obj.get("endTime"):
+            ws.send(json.dumps({"type": "error", "error": "Session not found or already ended"}))
+            return
+
+        stream = _LiveStream(
+            db,
+            session_obj,
+            auto_mark=request.args.get("autoMark", "1") not in ("0", "false"),
+            multi_face=request.args.get("multiFace", "1") not in ("0", "false"),
+        )
+        ws.send(json.dumps({"type": "ready", "sessionId": session_id, "class": stream.class_name,
+                            "presentCount": present_students.count(db, session_id)}))
+
+        while True:
+            message = ws.receive(timeout=STREAM_IDLE_TIMEOUT_SECONDS)
+            if message is None:
+                ws.send(json.dumps({"type": "error", "error": "idle_timeout"}))
+                return
+            control = message if isinstance(message, str) else None
+            if control is None:
+                if not stream.active():
+                    # Ended meanwhile: stop before the recognizer re-creates the released
+                    # class gallery / tracker, and before anything is marked.
+                    ws.send(json.dumps({"type": "error", "error": "Session not found or already ended"}))
+                    ws.close()
+                    return
+                frame, dropped, control = _latest_frame(ws, message)
+                stream.dropped += dropped
+                try:
+                    event = stream.process(frame)
+                except Exception as ex:
+                    logger.error("Stream frame failed: %s", ex)
+                    event = {"type": "result", "frame": stream.frames, "faces": [], "faces_detected": 0,
+                             "error": "verify_failed"}
+                ws.send(json.dumps(event, default=str))
+                for face in event["faces"]:
+                    if face.get("attendanceMarked"):
+                        ws.send(json.dumps({"type": "attendance", "user": face["user"]}))
+
+            if control is not None:
+                try:
+                    options = json.loads(control)
+                except ValueError:
+                    options = {}
+                if options.get("type") == "config":
+                    stream.configure(options)
+                elif options.get("type") == "ping":
+                    ws.send(json.dumps({"type": "pong"}))
+                elif options.get("type") == "close":
+                    return
@@ -54,6 +54,13 @@ def create_session():
         "gpsRadius": gps_radius if mode == Session.MODE_MOBILE else None,
     }
     Session.collection(db).insert_one(doc)
+
+    # Precompute the class-scoped face gallery so the first verify frame doesn't pay for it.
+    try:
+        from app.services.face_recognition_simple import get_recognizer
+        get_recognizer().prepare_session(session_id, class_name, db)
+    except Exception:
+        pass
     return jsonify({"session": Session.to_json(doc)}), 201
 
 
@@ -85,6 +92,13 @@ def end_session(session_id):
     )
     if result.modified_count == 0:
         return jsonify({"error": "Session not found or already ended"}), 404
+    try:
+        from app.services.attendance_service import present_students
+        from app.services.face_recognition_simple import get_recognizer
+        get_recognizer().release_session(session_id)
+        present_students.release(session_id)
+    except Exception:
+        pass
     return jsonify({"message": "Session ended"})
 
 
@@ -3,7 +3,8 @@ from bson import ObjectId
 from datetime import datetime, timedelta
 from app.extensions import get_mongo, require_auth
 from app.models.user import User
-from app.models.attendance import Attendance
+from app.services.attendance_service import student_attendance_stats
+from app.services.embedding_codec import embedding_update
 from app.services.face_service import FaceService
 from app.services.supabase_storage import upload_face_image
 
@@ -19,16 +20,9 @@ def me():
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    # Attendance stats: total sessions attended vs total (by subject/class if needed)
-    pipeline = [
-        {"$match": {"studentId": user_id}},
-        {"$group": {"_id": {"subject": "$subject", "class": "$class"}, "count": {"$sum": 1}}},
-    ]
-    by_subject = list(Attendance.collection(db).aggregate(pipeline))
-    total_attended = Attendance.collection(db).count_documents({"studentId": user_id})
-
+    # Attendance stats (total and by subject/class), read from the pre-aggregated rollups
     out = User.to_json(user)
-    out["attendanceStats"] = {"totalAttended": total_attended, "bySubject": by_subject}
+    out["attendanceStats"] = student_attendance_stats(db, user_id)
     return jsonify({"user": out})
 
 
@@ -75,12 +69,19 @@ def register_student_face():
         exclude_user_id=student_id,
     )
     if not result.get("success"):
-        return jsonify({"error": result.get("error", "Registration failed")}), 400
+        # Faculty get the closest existing users so they can audit the clash.
+        return jsonify({"error": result.get("error", "Registration failed"), "conflicts": result.get("conflicts", [])}), 400
 
     url = upload_face_image(image_bytes, f"{student_id}_{student.get('email', '').replace('@', '_')}.jpg")
-    update = {"faceEncoding": result["encoding"], "faceRegistered": True}
+    update, to_unset = embedding_update(result["encoding"])
+    update.update({"faceRegistered": True, "faceRegisteredAt": datetime.utcnow()})
     if url:
         update["supabaseImageUrl"] = url
-    User.collection(db).update_one({"_id": oid}, {"$set": update})
+    User.collection(db).update_one({"_id": oid}, {"$set": update, "$unset": to_unset})
     updated = User.collection(db).find_one({"_id": oid})
+    try:
+        from app.services.face_recognition_simple import get_recognizer
+        get_recognizer().upsert_user(updated, db=db)
+    except Exception:
+        pass
     return jsonify({"message": "Face registered", "student": User.to_json(updated)})
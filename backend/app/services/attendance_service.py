@@ -1,29 +1,399 @@
-from datetime import datetime
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.config import Config
 from app.models.attendance import Attendance
+from app.models.attendance_rollup import AttendanceRollup
 from app.models.session import Session
 
+logger = logging.getLogger(__name__)
+DUPLICATE_KEY = 11000
+
+ROLLUP_REBUILD_LOCK = "attendanceRollupRebuild"   # settings document _id
+ROLLUP_REBUILD_LOCK_SECONDS = 3600      # a crashed rebuild's lock expires after this
+
+PRESENT_CACHE_TTL_SECONDS = 12 * 3600   # forget sessions untouched this long
+PRESENT_CACHE_MAX_SESSIONS = 512        # least recently used sessions are dropped beyond this
+SESSION_DOC_TTL_SECONDS = 60            # re-read the session document this often
+
+
+class PresentStudents:
+    """
+    Per-session in-memory set of students already marked present, seeded from the
+    `attendances` collection the first time a session is touched, plus a short-lived
+    copy of the session document.
+    Only sessions that exist and have not ended get an entry (the id comes straight
+    from unauthenticated requests), and at most PRESENT_CACHE_MAX_SESSIONS are kept.
+    Attendance is never un-marked, so a hit is authoritative; a miss (e.g. marked by
+    another worker process, or a session without an entry) still falls back to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def _get(self, session_id: str) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if now - entry["touched_at"] > PRESENT_CACHE_TTL_SECONDS:
+                self._sessions.pop(session_id, None)
+                return None
+            self._sessions.move_to_end(session_id)
+            entry["touched_at"] = now
+            return entry
+
+    def _create(self, db, session_id: str, session_doc: Dict) -> Dict:
+        present = {
+            doc["studentId"]
+            for doc in Attendance.collection(db).find({"sessionId": session_id}, {"studentId": 1})
+        }
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.setdefault(
+                session_id, {"present": present, "session": session_doc, "session_at": now, "touched_at": now}
+            )
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > PRESENT_CACHE_MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        return entry
+
+    def _entry(self, db, session_id: str) -> Optional[Dict]:
+        entry = self._get(session_id)
+        if entry is None and self.session(db, session_id) is not None:
+            entry = self._get(session_id)
+        return entry
+
+    def session(self, db, session_id: str) -> Optional[Dict]:
+        """Session document, re-read at most every SESSION_DOC_TTL_SECONDS."""
+        if not session_id:
+            return None
+        entry = self._get(session_id)
+        now = time.monotonic()
+        if entry is not None and now - entry["session_at"] <= SESSION_DOC_TTL_SECONDS:
+            return entry["session"]
+
+        doc = Session.collection(db).find_one({"sessionId": session_id})
+        if doc is None or doc.get("endTime"):
+            self.release(session_id)
+            return doc
+        if entry is None:
+            self._create(db, session_id, doc)
+        else:
+            entry["session"], entry["session_at"] = doc, now
+        return doc
+
+    def contains(self, db, session_id: str, student_id: str) -> bool:
+        entry = self._entry(db, session_id)
+        return entry is not None and student_id in entry["present"]
+
+    def count(self, db, session_id: str) -> int:
+        entry = self._entry(db, session_id)
+        if entry is None:
+            return Attendance.collection(db).count_documents({"sessionId": session_id})
+        return len(entry["present"])
+
+    def add(self, db, session_id: str, student_id: str):
+        entry = self._get(session_id)
+        if entry is not None:
+            entry["present"].add(student_id)
+
+    def release(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+present_students = PresentStudents()
+
+
+class SessionEnded(RuntimeError):
+    """Raised by AttendanceWriter.mark for a session that has ended or does not exist."""
+
+
+class AttendanceWriter:
+    """
+    Buffers attendance marks and writes each batch with one unordered bulk_write.
+    - Every mark is an upsert on (sessionId, studentId) with $setOnInsert, so concurrent
+      frames or worker processes can never create a second record for a student
+    - Sessions' presentCount is $inc'd by the number of records actually inserted
+    - `mark` blocks until its batch is flushed and returns whether it created the record
+    """
+
+    def __init__(self, flush_interval_ms: float = 100.0, max_batch_size: int = 500):
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # Started lazily so each gunicorn worker gets its own thread after fork.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+                self._thread.start()
+
+    def mark(self, db, doc: Dict, timeout: float = 10.0) -> bool:
+        """Queue one attendance record (must carry sessionId and studentId); True if it was inserted."""
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((db, doc, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self) -> List:
+        pending = [self._queue.get()]
+        deadline = time.perf_counter() + self.flush_interval
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                pending.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            by_db: Dict[str, List] = {}
+            for item in pending:
+                by_db.setdefault(item[0].name, []).append(item)
+            for items in by_db.values():
+                try:
+                    self._flush(items[0][0], items)
+                except Exception as ex:
+                    logger.warning("Attendance flush of %d marks failed: %s", len(items), ex)
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(ex)
+
+    def _flush(self, db, items):
+        # Marks for sessions that have ended (or don't exist) are refused, whatever cached
+        # session state the caller acted on: one query per batch.
+        session_ids = list({item[1]["sessionId"] for item in items})
+        open_sessions = {
+            doc["sessionId"]
+            for doc in Session.collection(db).find({"sessionId": {"$in": session_ids}, "endTime": None}, {"sessionId": 1})
+        }
+        for _, doc, future in items:
+            if doc["sessionId"] not in open_sessions:
+                future.set_exception(SessionEnded(doc["sessionId"]))
+        items = [item for item in items if item[1]["sessionId"] in open_sessions]
+        if not items:
+            return
+
+        # Same student twice in one batch: only the first op is sent, the rest resolve as duplicates.
+        first: Dict = {}
+        ops, op_items = [], []
+        for item in items:
+            key = (item[1]["sessionId"], item[1]["studentId"])
+            if key in first:
+                continue
+            first[key] = item
+            ops.append(UpdateOne({"sessionId": key[0], "studentId": key[1]}, {"$setOnInsert": item[1]}, upsert=True))
+            op_items.append(item)
+
+        failed: Dict[int, Dict] = {}
+        try:
+            result = Attendance.collection(db).bulk_write(ops, ordered=False)
+            upserted = set(result.upserted_ids or {})
+        except BulkWriteError as ex:
+            # A racing upsert from another process loses with E11000: the record exists, so it's a duplicate.
+            upserted = {u["index"] for u in ex.details.get("upserted", [])}
+            failed = {e["index"]: e for e in ex.details.get("writeErrors", []) if e.get("code") != DUPLICATE_KEY}
+
+        inserted_per_session: Dict[str, int] = {}
+        for index, (_, doc, _) in enumerate(op_items):
+            if index in upserted:
+                inserted_per_session[doc["sessionId"]] = inserted_per_session.get(doc["sessionId"], 0) + 1
+        if inserted_per_session:
+            Session.collection(db).bulk_write(
+                [UpdateOne({"sessionId": sid}, {"$inc": {"presentCount": n}}) for sid, n in inserted_per_session.items()],
+                ordered=False,
+            )
+            try:
+                record_rollups(db, [doc for index, (_, doc, _) in enumerate(op_items) if index in upserted])
+            except Exception as ex:
+                # The marks are already stored; a rollup rebuild repairs the counters.
+                logger.warning("Attendance rollup update failed: %s", ex)
+
+        for index, (_, doc, future) in enumerate(op_items):
+            if index in failed:
+                future.set_exception(RuntimeError(failed[index].get("errmsg", "attendance write failed")))
+                continue
+            present_students.add(db, doc["sessionId"], doc["studentId"])
+            future.set_result(index in upserted)
+        for _, _, future in items:
+            if not future.done():
+                future.set_result(False)
+
+
+def record_rollups(db, docs: List[Dict]):
+    """$inc every rollup counter the newly inserted attendance records contribute to."""
+    increments: Dict[str, List] = {}
+    for doc in docs:
+        for rollup_id, fields in AttendanceRollup.keys_for(doc):
+            increments.setdefault(rollup_id, [fields, 0])[1] += 1
+    if not increments:
+        return
+    AttendanceRollup.collection(db).bulk_write(
+        [
+            UpdateOne({"_id": rollup_id}, {"$inc": {"count": n}, "$setOnInsert": fields}, upsert=True)
+            for rollup_id, (fields, n) in increments.items()
+        ],
+        ordered=False,
+    )
+
+
+def _rollup_locks(db):
+    return db.settings
+
+
+def _acquire_rebuild_lock(db, owner: str) -> bool:
+    now = datetime.utcnow()
+    try:
+        # Matches only an expired lock; otherwise the upsert collides on _id and fails.
+        _rollup_locks(db).find_one_and_update(
+            {"_id": ROLLUP_REBUILD_LOCK, "lockedUntil": {"$lt": now}},
+            {"$set": {"lockedUntil": now + timedelta(seconds=ROLLUP_REBUILD_LOCK_SECONDS), "owner": owner}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def _release_rebuild_lock(db, owner: str):
+    _rollup_locks(db).update_one(
+        {"_id": ROLLUP_REBUILD_LOCK, "owner": owner}, {"$set": {"lockedUntil": datetime(1970, 1, 1)}}
+    )
+
+
+def rebuild_rollups(db) -> Optional[Dict[str, int]]:
+    """
+    Recompute every rollup counter from the `attendances` collection and drop counters
+    an earlier rebuild wrote that no longer have any records. Counters created only by
+    live increments are never deleted. Holds a MongoDB lock, so concurrent runs are
+    refused (None). Marks written while it runs may be counted twice or lost, so run
+    it when no session is taking attendance.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    if not _acquire_rebuild_lock(db, owner):
+        return None
+    try:
+        sources = {"date": "$date", "class": "$class", "subject": "$subject", "studentId": "$studentId"}
+        stamp = datetime.utcnow()
+        written: Dict[str, int] = {}
+        for kind, names in AttendanceRollup.KINDS.items():
+            pipeline = [{"$group": {"_id": {n: sources[n] for n in names}, "count": {"$sum": 1}}}]
+            if kind in AttendanceRollup.DATE_KINDS:
+                pipeline.insert(0, {"$match": {"date": {"$nin": [None, ""]}}})
+            ops = []
+            for row in Attendance.collection(db).aggregate(pipeline, allowDiskUse=True):
+                fields = {"kind": kind, **{n: row["_id"].get(n) for n in names}}
+                rollup_id = AttendanceRollup.make_id(kind, fields)
+                ops.append(UpdateOne(
+                    {"_id": rollup_id},
+                    {"$set": {**fields, "count": row["count"], "rebuiltAt": stamp}},
+                    upsert=True,
+                ))
+                if len(ops) >= 1000:
+                    AttendanceRollup.collection(db).bulk_write(ops, ordered=False)
+                    ops = []
+            if ops:
+                AttendanceRollup.collection(db).bulk_write(ops, ordered=False)
+            written[kind] = AttendanceRollup.collection(db).count_documents({"kind": kind, "rebuiltAt": stamp})
+        AttendanceRollup.collection(db).delete_many({"rebuiltAt": {"$exists": True, "$ne": stamp}})
+        _rollup_locks(db).update_one({"_id": ROLLUP_REBUILD_LOCK}, {"$set": {"rebuiltAt": stamp}})
+        return written
+    finally:
+        _release_rebuild_lock(db, owner)
+
+
+_rollups_built = False
+
+
+def rollups_built(db) -> bool:
+    """
+    True once `rebuild_rollups` has completed against this database. Until then the
+    counters only hold marks made since deploy, so readers fall back to aggregating
+    `attendances` directly.
+    """
+    global _rollups_built
+    if not _rollups_built:
+        _rollups_built = _rollup_locks(db).find_one(
+            {"_id": ROLLUP_REBUILD_LOCK, "rebuiltAt": {"$exists": True}}, {"_id": 1}
+        ) is not None
+    return _rollups_built
+
+
+def day_attendance_count(db, date: str) -> int:
+    if not rollups_built(db):
+        return Attendance.collection(db).count_documents({"date": date})
+    doc = AttendanceRollup.collection(db).find_one({"_id": AttendanceRollup.make_id("day", {"date": date})})
+    return doc["count"] if doc else 0
+
+
+def student_attendance_stats(db, student_id: str) -> Dict:
+    """{"totalAttended", "bySubject": [{"_id": {"subject", "class"}, "count"}]} from the rollups."""
+    if not rollups_built(db):
+        by_subject = list(Attendance.collection(db).aggregate([
+            {"$match": {"studentId": student_id}},
+            {"$group": {"_id": {"subject": "$subject", "class": "$class"}, "count": {"$sum": 1}}},
+        ]))
+        return {"totalAttended": sum(row["count"] for row in by_subject), "bySubject": by_subject}
+    total = AttendanceRollup.collection(db).find_one(
+        {"_id": AttendanceRollup.make_id("student", {"studentId": student_id})}
+    )
+    by_subject = [
+        {"_id": {"subject": doc.get("subject"), "class": doc.get("class")}, "count": doc["count"]}
+        for doc in AttendanceRollup.collection(db).find({"kind": "student_subject", "studentId": student_id})
+    ]
+    return {"totalAttended": total["count"] if total else 0, "bySubject": by_subject}
+
+
+attendance_writer = AttendanceWriter(
+    flush_interval_ms=Config.ATTENDANCE_FLUSH_INTERVAL_MS,
+    max_batch_size=Config.ATTENDANCE_FLUSH_MAX_BATCH,
+)
+
 
 def mark_attendance(db, session_id: str, student_id: str, student_name: str, subject: str, class_name: str, mode: str) -> tuple[bool, str]:
     """Mark attendance once per session. Returns (success, message)."""
-    existing = Attendance.collection(db).find_one({"sessionId": session_id, "studentId": student_id})
-    if existing:
-        return False, "Already marked"
-
     session = Session.collection(db).find_one({"sessionId": session_id})
     if not session:
         return False, "Session not found"
     if session.get("endTime"):
         return False, "Session ended"
+    if present_students.contains(db, session_id, student_id):
+        return False, "Already marked"
 
     now = datetime.utcnow()
-    Attendance.collection(db).insert_one({
-        "sessionId": session_id,
-        "studentId": student_id,
-        "studentName": student_name,
-        "subject": subject,
-        "class": class_name,
-        "date": now.date().isoformat(),
-        "time": now.strftime("%H:%M:%S"),
-        "mode": mode,
-    })
+    try:
+        inserted = attendance_writer.mark(db, {
+            "sessionId": session_id,
+            "studentId": student_id,
+            "studentName": student_name,
+            "subject": subject,
+            "class": class_name,
+            "date": now.date().isoformat(),
+            "time": now.strftime("%H:%M:%S"),
+            "mode": mode,
+        })
+    except SessionEnded:
+        return False, "Session ended"
+    if not inserted:
+        return False, "Already marked"
     return True, "Marked present"
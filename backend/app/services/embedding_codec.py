@@ -0,0 +1,139 @@
+"""
+Compact BSON storage for Facenet512 embeddings.
+
+A stored embedding (or prototype set) is one BSON Binary (subtype 0x80) holding:
+    header  "<2sBBHH": magic b"FE", format version, dtype code, rows, dim
+    int8    rows float32 scales (max |v| / 127 per row), then rows*dim int8
+    float16 rows*dim little-endian float16
+Legacy documents store plain arrays of doubles; every reader here accepts both, so
+`scripts.migrate_embeddings` can convert users in place while the app is running.
+"""
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from bson.binary import Binary
+
+from app.config import Config
+
+MODEL_NAME = "Facenet512"
+BINARY_SUBTYPE = 0x80           # user-defined subtype
+MAGIC = b"FE"
+VERSION = 1
+HEADER = struct.Struct("<2sBBHH")
+
+FORMAT_FLOAT16 = "float16"
+FORMAT_INT8 = "int8"
+_DTYPE_CODES = {FORMAT_FLOAT16: 1, FORMAT_INT8: 2}
+_DTYPE_NAMES = {code: name for name, code in _DTYPE_CODES.items()}
+
+# Pre-compact copy of the base vector; dropped whenever a user's embedding is rewritten.
+LEGACY_FIELDS = ("embedding",)
+EMBEDDING_FIELDS = ("embeddings", "embeddingPrototypes") + LEGACY_FIELDS
+# Single-photo encoding from before prototypes; only read when explicitly enabled and
+# never removed on re-encode (`migrate_embeddings --promote-face-encoding` moves it).
+FACE_ENCODING_FIELD = "faceEncoding"
+
+
+def encode_matrix(vectors, fmt: Optional[str] = None) -> Binary:
+    """Pack a (rows, dim) matrix (or a single vector) as a compact Binary."""
+    fmt = fmt or Config.FACE_EMBEDDING_FORMAT
+    if fmt not in _DTYPE_CODES:
+        raise ValueError(f"Unknown embedding format: {fmt}")
+    mat = np.array(vectors, dtype=np.float32, ndmin=2)
+    rows, dim = mat.shape
+    header = HEADER.pack(MAGIC, VERSION, _DTYPE_CODES[fmt], rows, dim)
+    if fmt == FORMAT_INT8:
+        scales = np.abs(mat).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(mat / scales[:, None]), -127, 127).astype(np.int8)
+        payload = scales.astype("<f4").tobytes() + quantized.tobytes()
+    else:
+        payload = mat.astype("<f2").tobytes()
+    return Binary(header + payload, BINARY_SUBTYPE)
+
+
+def is_encoded(value) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:2]) == MAGIC
+
+
+def describe(value) -> Optional[Tuple[str, int, int]]:
+    """(format, rows, dim) of an encoded value, None for legacy arrays."""
+    if not is_encoded(value):
+        return None
+    _, _, code, rows, dim = HEADER.unpack_from(value)
+    return _DTYPE_NAMES.get(code), rows, dim
+
+
+def decode_matrix(value) -> Optional[np.ndarray]:
+    """
+    2-D view of a stored embedding. float16 payloads come back as a zero-copy
+    np.frombuffer view (callers cast once, e.g. in normalize_rows); int8 payloads are
+    dequantized to float32; legacy arrays are converted to float32.
+    """
+    if value is None:
+        return None
+    if not is_encoded(value):
+        try:
+            mat = np.array(value, dtype=np.float32, ndmin=2)
+        except (TypeError, ValueError):
+            return None
+        return mat if mat.ndim == 2 and mat.size else None
+
+    _, version, code, rows, dim = HEADER.unpack_from(value)
+    if version != VERSION or code not in _DTYPE_NAMES:
+        raise ValueError(f"Unsupported embedding encoding v{version}/{code}")
+    offset = HEADER.size
+    if _DTYPE_NAMES[code] == FORMAT_INT8:
+        scales = np.frombuffer(value, dtype="<f4", count=rows, offset=offset)
+        data = np.frombuffer(value, dtype=np.int8, count=rows * dim, offset=offset + 4 * rows)
+        return data.reshape(rows, dim) * scales[:, None]
+    return np.frombuffer(value, dtype="<f2", count=rows * dim, offset=offset).reshape(rows, dim)
+
+
+def decode_vector(value) -> Optional[np.ndarray]:
+    mat = decode_matrix(value)
+    return None if mat is None else mat[0]
+
+
+def stored_embedding(doc: Dict, include_face_encoding: Optional[bool] = None) -> Optional[np.ndarray]:
+    """
+    A user's base Facenet512 vector, wherever and however it is stored. `faceEncoding`
+    is only used when `include_face_encoding` (default: FACE_GALLERY_LEGACY_ENCODINGS).
+    """
+    embeddings = doc.get("embeddings")
+    if isinstance(embeddings, dict) and embeddings.get(MODEL_NAME) is not None:
+        return decode_vector(embeddings[MODEL_NAME])
+    if include_face_encoding is None:
+        include_face_encoding = Config.FACE_GALLERY_LEGACY_ENCODINGS
+    fields = LEGACY_FIELDS + ((FACE_ENCODING_FIELD,) if include_face_encoding else ())
+    for field in fields:
+        if doc.get(field) is not None:
+            return decode_vector(doc[field])
+    return None
+
+
+def stored_prototypes(doc: Dict) -> Optional[np.ndarray]:
+    """A user's prototype matrix; falls back to the base vector as a single prototype."""
+    prototypes = doc.get("embeddingPrototypes")
+    if prototypes is not None and len(prototypes):
+        mat = decode_matrix(prototypes)
+        if mat is not None:
+            return mat
+    base = stored_embedding(doc)
+    return None if base is None else base[None, :]
+
+
+def embedding_update(base, prototypes=None, fmt: Optional[str] = None) -> Tuple[Dict, Dict]:
+    """
+    ($set, $unset) documents that store a user's embedding in the compact format,
+    keeping one copy of the base vector and dropping the legacy `embedding` duplicate
+    (and any stale prototypes when none are given). `faceEncoding` is left alone.
+    """
+    to_set = {"embeddings": {MODEL_NAME: encode_matrix(base, fmt)}}
+    to_unset = {field: "" for field in LEGACY_FIELDS}
+    if prototypes is not None and len(prototypes):
+        to_set["embeddingPrototypes"] = encode_matrix(prototypes, fmt)
+    else:
+        to_unset["embeddingPrototypes"] = ""
+    return to_set, to_unset
@@ -0,0 +1,284 @@
+"""Contiguous prototype gallery for vectorized Facenet512 matching."""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_codec import MODEL_NAME, stored_prototypes
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Return a C-contiguous float32 copy of `vectors` with L2-normalized rows."""
+    mat = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True) + 1e-9
+    return np.ascontiguousarray(mat / norms, dtype=np.float32)
+
+
+def user_record(doc: Dict) -> Optional[Dict]:
+    """
+    Extract gallery metadata + Facenet512 prototypes from a user document.
+    Returns None when the document carries no usable embedding.
+    """
+    try:
+        prototypes = stored_prototypes(doc)
+    except ValueError:
+        return None
+    if prototypes is None:
+        return None
+
+    return {
+        "user_id": str(doc["_id"]),
+        "name": doc.get("name", "Unknown"),
+        "rollNo": doc.get("rollNo", ""),
+        "class": doc.get("class"),
+        "role": doc.get("role"),
+        "prototypes": prototypes,
+    }
+
+
+def _role_masks(users: List[Dict]) -> Dict[str, np.ndarray]:
+    masks: Dict[str, np.ndarray] = {}
+    for i, user in enumerate(users):
+        role = user.get("role")
+        if role not in masks:
+            masks[role] = np.zeros(len(users), dtype=bool)
+        masks[role][i] = True
+    return masks
+
+
+# Spare rows reserved whenever a gallery has to reallocate its buffer for an append.
+GROWTH_FACTOR = 1.25
+MIN_SPARE_ROWS = 256
+# Removed users stay as masked rows until they exceed this share of the matrix.
+COMPACT_DEAD_FRACTION = 0.25
+
+
+class FaceGallery:
+    """
+    Immutable snapshot of enrolled face prototypes.
+    - `matrix` holds every prototype as one L2-normalized float32 row
+    - rows are grouped per user; `offsets[i]` is the first row of `users[i]`
+    - `row_user[r]` maps row `r` back to its index in `users`
+    - `role_masks[role]` is a bool per user, built once here (and extended on append)
+    - `alive[i]` is False for users removed by `replace_users`; their rows are masked
+      out of every search until the gallery is compacted
+    `matrix` is a prefix view of a larger buffer: the newest snapshot appends new rows
+    into the spare capacity past its end, which older snapshots never look at.
+    """
+
+    def __init__(self, users: List[Dict], matrix: np.ndarray, counts):
+        counts = np.asarray(counts, dtype=np.int64)
+        self.users = users
+        self.matrix = matrix
+        self.counts = counts
+        self.offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64) if len(counts) else counts
+        self.row_user = np.repeat(np.arange(len(users), dtype=np.int64), counts)
+        self.alive = np.ones(len(users), dtype=bool)
+        self.positions = {u["user_id"]: i for i, u in enumerate(users)}
+        self.role_masks = _role_masks(users)
+        self._alive_users = len(users)
+        self._alive_rows = int(matrix.shape[0])
+        # Shared by every snapshot appended from this one; `_tail[0]` is the number of
+        # buffer rows in use, so only the snapshot ending there may append in place.
+        self._buffer = matrix
+        self._tail = [int(matrix.shape[0])]
+        # Optional candidate index (see gallery_index.build_index), attached after build.
+        self.index = None
+
+    @classmethod
+    def empty(cls) -> "FaceGallery":
+        return cls([], np.zeros((0, 0), dtype=np.float32), [])
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "FaceGallery":
+        """Build a gallery from `user_record` dicts; malformed prototype sets are skipped."""
+        users, blocks, counts = [], [], []
+        dim = None
+        for rec in records:
+            try:
+                protos = normalize_rows(rec["prototypes"])
+            except (TypeError, ValueError):
+                continue
+            if protos.ndim != 2 or protos.shape[0] == 0:
+                continue
+            if dim is None:
+                dim = protos.shape[1]
+            if protos.shape[1] != dim:
+                continue
+            users.append({k: v for k, v in rec.items() if k != "prototypes"})
+            blocks.append(protos)
+            counts.append(protos.shape[0])
+
+        if not users:
+            return cls.empty()
+        return cls(users, np.ascontiguousarray(np.vstack(blocks)), counts)
+
+    def subset(self, user_indices) -> "FaceGallery":
+        """New gallery holding only the live users among `user_indices` (rows copied, order preserved)."""
+        user_indices = np.asarray(user_indices, dtype=np.int64)
+        user_indices = user_indices[self.alive[user_indices]]
+        if user_indices.size == 0:
+            return FaceGallery.empty()
+        matrix = np.ascontiguousarray(self.matrix[self.rows_for(user_indices)])
+        return FaceGallery([self.users[i] for i in user_indices], matrix, self.counts[user_indices])
+
+    def compacted(self) -> "FaceGallery":
+        """This gallery without the rows of removed users (self if there are none)."""
+        if self._alive_users == len(self.users):
+            return self
+        return self.subset(np.flatnonzero(self.alive))
+
+    def replace_users(self, records: List[Dict], remove_ids) -> "FaceGallery":
+        """
+        Copy-on-write update: drop `remove_ids` (and any user re-supplied in `records`),
+        then append `records`. Dropped users are only masked and new rows go into spare
+        buffer capacity, so an update costs O(changed rows), not a copy of the matrix.
+        The current snapshot is left untouched for readers.
+        """
+        drop = set(remove_ids) | {rec["user_id"] for rec in records}
+        dead = [self.positions[uid] for uid in drop if uid in self.positions]
+        added = FaceGallery.from_records(records)
+        if len(added) and len(self.users) and added.matrix.shape[1] != self.matrix.shape[1]:
+            added = FaceGallery.empty()
+        if not dead and not len(added):
+            return self
+
+        base = self._without(dead) if dead else self
+        if base.matrix.shape[0] - base._alive_rows > COMPACT_DEAD_FRACTION * base.matrix.shape[0]:
+            base = base.compacted()
+        if not len(added):
+            return base
+        if not len(base):
+            return added
+        return base._append(added)
+
+    def extends(self, other: "FaceGallery") -> bool:
+        """True if `other`'s rows are an unchanged prefix of this gallery's matrix."""
+        return other._buffer is self._buffer and other.matrix.shape[0] <= self.matrix.shape[0]
+
+    def _derive(self, **fields) -> "FaceGallery":
+        """Shallow copy sharing this gallery's arrays and buffer, with `fields` replaced."""
+        gallery = object.__new__(FaceGallery)
+        gallery.__dict__.update(self.__dict__)
+        gallery.__dict__.update(fields)
+        gallery.index = None
+        return gallery
+
+    def _without(self, dead: List[int]) -> "FaceGallery":
+        alive = self.alive.copy()
+        alive[dead] = False
+        positions = dict(self.positions)
+        for i in dead:
+            positions.pop(self.users[i]["user_id"], None)
+        return self._derive(
+            alive=alive,
+            positions=positions,
+            _alive_users=self._alive_users - len(dead),
+            _alive_rows=self._alive_rows - int(self.counts[dead].sum()),
+        )
+
+    def _append(self, added: "FaceGallery") -> "FaceGallery":
+        rows, n = self.matrix.shape[0], added.matrix.shape[0]
+        buffer, tail = self._buffer, self._tail
+        if tail[0] != rows or rows + n > buffer.shape[0] or not buffer.flags.writeable:
+            # Someone already appended past us, no room left, or a read-only (memory-mapped)
+            # snapshot: move to a fresh buffer with spare capacity.
+            capacity = rows + n + max(MIN_SPARE_ROWS, int((rows + n) * (GROWTH_FACTOR - 1)))
+            buffer = np.empty((capacity, self.matrix.shape[1]), dtype=np.float32)
+            buffer[:rows] = self.matrix
+            tail = [rows]
+        buffer[rows:rows + n] = added.matrix
+        tail[0] = rows + n
+
+        first = len(self.users)
+        role_masks = {
+            role: np.concatenate([
+                self.role_masks.get(role, np.zeros(first, dtype=bool)),
+                added.role_masks.get(role, np.zeros(len(added.users), dtype=bool)),
+            ])
+            for role in set(self.role_masks) | set(added.role_masks)
+        }
+        positions = dict(self.positions)
+        positions.update({u["user_id"]: first + i for i, u in enumerate(added.users)})
+        return self._derive(
+            users=self.users + added.users,
+            matrix=buffer[:rows + n],
+            counts=np.concatenate([self.counts, added.counts]),
+            offsets=np.concatenate([self.offsets, added.offsets + rows]),
+            row_user=np.concatenate([self.row_user, added.row_user + first]),
+            alive=np.concatenate([self.alive, added.alive]),
+            positions=positions,
+            role_masks=role_masks,
+            _alive_users=self._alive_users + len(added),
+            _alive_rows=self._alive_rows + n,
+            _buffer=buffer,
+            _tail=tail,
+        )
+
+    def __len__(self) -> int:
+        return self._alive_users
+
+    @property
+    def num_prototypes(self) -> int:
+        return self._alive_rows
+
+    def user_similarities(self, query) -> np.ndarray:
+        """
+        Best cosine similarity per user: one mat-vec product + segmented max.
+        A 1-D query returns shape (n_users,); a 2-D batch returns (n_queries, n_users).
+        """
+        q = np.asarray(query, dtype=np.float32)
+        single = q.ndim == 1
+        q = normalize_rows(q)
+        sims = q @ self.matrix.T
+        per_user = np.maximum.reduceat(sims, self.offsets, axis=1)
+        if self._alive_users != len(self.users):
+            per_user[:, ~self.alive] = -np.inf
+        return per_user[0] if single else per_user
+
+    def rows_for(self, user_indices) -> np.ndarray:
+        """Row numbers of every prototype belonging to `user_indices`, grouped in that order."""
+        user_indices = np.asarray(user_indices, dtype=np.int64)
+        counts = self.counts[user_indices]
+        starts = self.offsets[user_indices] - (np.cumsum(counts) - counts)
+        return np.repeat(starts, counts) + np.arange(int(counts.sum()), dtype=np.int64)
+
+    def best_among(self, query, user_indices) -> Tuple[Optional[int], float]:
+        """Exact best match restricted to `user_indices` (used to re-rank ANN candidates)."""
+        user_indices = np.asarray(user_indices, dtype=np.int64)
+        if user_indices.size == 0:
+            return None, -1.0
+        q = normalize_rows(query)[0]
+        counts = self.counts[user_indices]
+        sims = self.matrix[self.rows_for(user_indices)] @ q
+        per_user = np.maximum.reduceat(sims, np.cumsum(counts) - counts)
+        per_user = np.where(self.alive[user_indices], per_user, -np.inf)
+        pos = int(np.argmax(per_user))
+        return int(user_indices[pos]), float(per_user[pos])
+
+    def top_k(self, query, k: int, min_similarity: float = -1.0, mask=None) -> List[Tuple[int, float]]:
+        """
+        Up to `k` (user index, cosine similarity) pairs, best first, with similarity >=
+        `min_similarity`. `mask` (bool per user) limits the candidates.
+        """
+        if not len(self) or k <= 0:
+            return []
+        per_user = self.user_similarities(query)
+        if mask is not None:
+            per_user = np.where(mask, per_user, -np.inf)
+        k = min(k, len(per_user))
+        top = np.argpartition(-per_user, k - 1)[:k]
+        top = top[np.argsort(-per_user[top])]
+        return [(int(i), float(per_user[i])) for i in top if per_user[i] >= min_similarity]
+
+    def role_mask(self, role: str) -> np.ndarray:
+        """Precomputed bool per user: the user has `role` (for top_k's mask)."""
+        mask = self.role_masks.get(role)
+        return mask if mask is not None else np.zeros(len(self.users), dtype=bool)
+
+    def best_match(self, query) -> Tuple[Optional[int], float]:
+        """Return (user index, cosine similarity) of the closest user, or (None, -1.0) if empty."""
+        if not len(self):
+            return None, -1.0
+        per_user = self.user_similarities(query)
+        idx = int(np.argmax(per_user))
+        return idx, float(per_user[idx])
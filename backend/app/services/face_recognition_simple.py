@@ -1,10 +1,19 @@
 """Face recognition service backed by OpenCV + Facenet512 embeddings."""
+import threading
+import time
 import cv2
 import numpy as np
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 from app.services.ml_service import ml_service
 from app.models.user import User
-from datetime import datetime
+from app.config import Config
+from app.services.face_gallery import MODEL_NAME, FaceGallery, user_record
+from app.services.face_tracker import FaceTracker
+from app.services.frame_pipeline import PreparedFrame, prepare_frame
+from app.services.gallery_index import build_index
+from app.services.gallery_loader import iter_records, load_gallery
+from app.services import gallery_snapshot
+from datetime import datetime, timedelta
 
 # ===================== CONFIG =====================
 THRESHOLDS = {
@@ -12,6 +21,10 @@ THRESHOLDS = {
     "Facenet512": 0.75
 }
 ENSEMBLE_THRESHOLD = 35.0
+SESSION_GALLERY_TTL_SECONDS = 12 * 3600
+MAX_ACTIVE_SESSIONS = 512       # per-session galleries / trackers kept; least recently used go first
+DELTA_SYNC_INTERVAL = 30        # seconds between background delta syncs
+DELTA_SYNC_OVERLAP = 5          # re-read this many seconds before the last sync (clock skew)
 LOCK_FRAMES = 40
 EMOTION_INTERVAL = 15
 # =================================================
@@ -33,9 +46,27 @@ def distance_to_percent(dist, threshold):
 
 class MultiModelRecognizer:
     def __init__(self):
-        self.database = []
+        self.gallery = FaceGallery.empty()
         self.last_load_time = None
         self.load_interval = 300 # Refresh DB every 5 minutes
+        self.delta_interval = DELTA_SYNC_INTERVAL
+        # Writers (full reload, upsert/remove, delta sync) serialize on this lock;
+        # readers just grab the current self.gallery snapshot.
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._delta_lock = threading.Lock()   # one delta sync at a time (background + checks)
+        self._wake = threading.Event()
+        self._reload_requested = False
+        self._loading = False
+        self._pending_changes = []
+        self._synced_at = None
+        self._sync_db = None
+        self._sync_thread = None
+        self.load_stats = {}
+        # sessionId -> class-scoped candidate gallery, updated alongside the global gallery
+        self.session_galleries = {}
+        # sessionId -> FaceTracker; locked tracks skip Facenet512 on the following frames
+        self.trackers = {}
         self.face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
         )
@@ -44,108 +75,398 @@ class MultiModelRecognizer:
         self.last_emotion = "neutral"
 
     def invalidate_cache(self):
-        """Force next recognition request to reload user embeddings."""
-        self.last_load_time = None
+        """Ask the background worker to rebuild the gallery from MongoDB soon."""
+        self._reload_requested = True
+        self._wake.set()
 
     def refresh_database(self, db):
-        """Fetch all registered users from MongoDB."""
+        """
+        Make sure a gallery is available. Only the very first (cold-start) load runs
+        inline; periodic full reloads run on the background sync thread, which builds
+        a new snapshot off to the side and swaps it in with a single assignment.
+        """
+        if self.last_load_time is None:
+            with self._load_lock:
+                if self.last_load_time is None and not self._load_snapshot(db):
+                    self._load_full(db)
+        self.start_background_sync(db)
+
+    def _load_snapshot(self, db) -> bool:
+        """Map the on-disk snapshot if it matches MongoDB's gallery version (cold start only)."""
+        path = Config.FACE_GALLERY_SNAPSHOT_PATH
+        if not path:
+            return False
+        started = time.perf_counter()
+        try:
+            version = gallery_snapshot.current_version(db)
+        except Exception as e:
+            print(f"[ERROR] Gallery version lookup failed: {e}")
+            return False
+        gallery = gallery_snapshot.read_snapshot(path, version)
+        if gallery is None:
+            return False
+        gallery.index = build_index(gallery)
         now = datetime.utcnow()
-        if self.last_load_time and (now - self.last_load_time).total_seconds() < self.load_interval:
+        with self._lock:
+            self.gallery = gallery
+            self.last_load_time = now
+            self._synced_at = now
+            self._rebuild_session_galleries()
+            self.load_stats = {
+                "source": "snapshot",
+                "version": version,
+                "users": len(gallery),
+                "prototypes": gallery.num_prototypes,
+                "seconds": round(time.perf_counter() - started, 4),
+                "loadedAt": now.isoformat(),
+            }
+        print(f"[ANTIGRAVITY] [OK] Mapped {len(gallery)} users from gallery snapshot v{version}.")
+        return True
+
+    def _write_snapshot(self, gallery: FaceGallery, version: Optional[int]):
+        path = Config.FACE_GALLERY_SNAPSHOT_PATH
+        if not path or version is None:
+            return
+        # Every worker reloads on its own schedule; only the first one per version writes.
+        if gallery_snapshot.snapshot_version(path) == version:
             return
+        gallery_snapshot.write_snapshot(path, gallery, version)
 
+    def _load_full(self, db):
+        """Read every registered user from MongoDB and swap in a fresh snapshot."""
+        now = datetime.utcnow()
+        with self._lock:
+            self._loading = True
+            self._pending_changes = []
         try:
             print("[ANTIGRAVITY] [SYNC] Refreshing face database from MongoDB...")
-            users = list(User.collection(db).find({"faceRegistered": True}))
-            
-            new_db = []
-            for u in users:
-                if "embeddings" not in u:
-                    if "embedding" in u:
-                        base_emb = np.array(u["embedding"], dtype=np.float32)
-                        proto_list = [base_emb]
-                        if isinstance(u.get("embeddingPrototypes"), list) and u["embeddingPrototypes"]:
-                            proto_list = [np.array(p, dtype=np.float32) for p in u["embeddingPrototypes"]]
-                        new_db.append({
-                            "user_id": str(u["_id"]),
-                            "name": u.get("name", "Unknown"),
-                            "rollNo": u.get("rollNo", ""),
-                            "embeddings": {"Facenet512": base_emb},
-                            "prototypes": {"Facenet512": proto_list},
-                        })
-                    continue
-
-                # Normal Multi-Model record
-                stored_embeds = {}
-                stored_prototypes = {}
-                for model, vec in u["embeddings"].items():
-                    if model == "Facenet512":
-                        stored_embeds[model] = np.array(vec, dtype=np.float32)
-                        proto_list = [stored_embeds[model]]
-                        if isinstance(u.get("embeddingPrototypes"), list) and u["embeddingPrototypes"]:
-                            proto_list = [np.array(p, dtype=np.float32) for p in u["embeddingPrototypes"]]
-                        stored_prototypes[model] = proto_list
-
-                new_db.append({
-                    "user_id": str(u["_id"]),
-                    "name": u.get("name", "Unknown"),
-                    "rollNo": u.get("rollNo", ""),
-                    "embeddings": stored_embeds,
-                    "prototypes": stored_prototypes,
-                })
-            
-            self.database = new_db
-            self.last_load_time = now
-            print(f"[ANTIGRAVITY] [OK] Loaded {len(self.database)} users from DB.")
-            
+            # Read before the users: a change during the load bumps it, so this snapshot goes stale.
+            try:
+                version = gallery_snapshot.current_version(db)
+            except Exception:
+                version = None
+            gallery, stats = load_gallery(db)
+            gallery.index = build_index(gallery)
+            self.load_stats = dict(stats, source="mongodb", version=version, loadedAt=now.isoformat())
+            with self._lock:
+                # Re-apply per-user changes that landed while the collection was being read.
+                if self._pending_changes:
+                    version = None
+                    for changed, removed in self._pending_changes:
+                        gallery = gallery.replace_users(changed, removed)
+                    gallery.index = build_index(gallery, previous=self.gallery.index)
+                self.gallery = gallery
+                self.last_load_time = now
+                self._synced_at = now
+                self._rebuild_session_galleries()
+            print(
+                f"[ANTIGRAVITY] [OK] Loaded {len(gallery)} users "
+                f"({gallery.num_prototypes} prototypes, {type(gallery.index).__name__}) from DB "
+                f"in {stats['seconds']:.3f}s, {stats['bytes'] / 1024:.0f} KiB received."
+            )
+            self._write_snapshot(gallery, version)
+
         except Exception as e:
              print(f"[ERROR] DB Refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+                self._pending_changes = []
 
-    def recognize_face(self, image_bytes: bytes, db) -> Optional[Dict]:
-        # Ensure DB is fresh
-        self.refresh_database(db)
+    def _apply_changes(self, records: List[Dict], remove_ids: List[str]):
+        with self._lock:
+            if self._loading:
+                self._pending_changes.append((records, remove_ids))
+            current = self.gallery
+            gallery = current.replace_users(records, remove_ids)
+            if gallery is not current:
+                gallery.index = build_index(gallery, previous=current.index)
+                self.gallery = gallery
+            self._update_session_galleries(records, remove_ids, gallery)
 
-        # Decode Image
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if frame is None: return None
+    def _update_session_galleries(self, records: List[Dict], remove_ids: List[str], source: FaceGallery):
+        """Apply one upsert/remove to every active class gallery (caller holds self._lock)."""
+        if not self.session_galleries:
+            return
+        # A re-supplied user is dropped everywhere, then re-added only where their class matches.
+        dropped = list(remove_ids) + [rec["user_id"] for rec in records]
+        for entry in self.session_galleries.values():
+            mine = [rec for rec in records if entry["class"] and rec.get("class") == entry["class"]]
+            entry["gallery"] = entry["gallery"].replace_users(mine, dropped)
+            entry["source"] = source
 
-        query_result = ml_service.generate_embedding(frame)
-        if not query_result:
+    def upsert_user(self, user_doc: Optional[Dict], db=None):
+        """
+        Insert/replace one user's prototypes from their MongoDB document (no full reload).
+        Pass `db` to also invalidate the on-disk gallery snapshot.
+        """
+        if not user_doc or "_id" not in user_doc:
+            return
+        if db is not None:
+            gallery_snapshot.bump_version(db)
+        record = user_record(user_doc) if user_doc.get("faceRegistered") else None
+        self._apply_changes([record] if record else [], [str(user_doc["_id"])])
+
+    def remove_user(self, user_id: str, db=None):
+        """Drop a user from the in-memory gallery (and invalidate the snapshot if `db` is given)."""
+        if db is not None:
+            gallery_snapshot.bump_version(db)
+        self._apply_changes([], [str(user_id)])
+
+    def sync_delta(self, db):
+        """
+        Pull users whose face data changed since the last sync, without re-reading the
+        whole collection: changed users that are still registered are upserted, changed
+        users that are not are dropped. Deleted users have no document left to stamp, so
+        other workers drop them on the next full reload (remove_user bumps the version).
+        """
+        with self._delta_lock:
+            started = datetime.utcnow()
+            since = (self._synced_at or started) - timedelta(seconds=DELTA_SYNC_OVERLAP)
+            # $in on faceRegistered keeps the (faceRegistered, ...) indexes usable for both branches.
+            changed = list(User.collection(db).find({
+                "faceRegistered": {"$in": [True, False]},
+                "$or": [{"faceRegisteredAt": {"$gte": since}}, {"updatedAt": {"$gte": since}}],
+            }, {"_id": 1, "faceRegistered": 1}))
+            changed_ids = [d["_id"] for d in changed if d.get("faceRegistered")]
+            known = self.gallery.positions
+            removed = [str(d["_id"]) for d in changed if not d.get("faceRegistered") and str(d["_id"]) in known]
+
+            records = list(iter_records(db, {"_id": {"$in": changed_ids}})) if changed_ids else []
+            remove_ids = removed + [str(oid) for oid in changed_ids]
+            if remove_ids:
+                self._apply_changes(records, remove_ids)
+            self._synced_at = started
+            return len(records), len(removed)
+
+    def start_background_sync(self, db):
+        """Start the background sync thread (once per process, i.e. after gunicorn fork)."""
+        if self._sync_thread is not None and self._sync_thread.is_alive():
+            return
+        with self._load_lock:
+            if self._sync_thread is not None and self._sync_thread.is_alive():
+                return
+            self._sync_db = db
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="face-gallery-sync", daemon=True)
+            self._sync_thread.start()
+
+    def _version_unchanged(self) -> bool:
+        loaded = self.load_stats.get("version")
+        if loaded is None:
+            return False
+        try:
+            return gallery_snapshot.current_version(self._sync_db) == loaded
+        except Exception:
+            return False
+
+    def _reload_due(self) -> bool:
+        if self._reload_requested or self.last_load_time is None:
+            return True
+        return (datetime.utcnow() - self.last_load_time).total_seconds() >= self.load_interval
+
+    def _sync_loop(self):
+        while True:
+            self._wake.wait(self.delta_interval)
+            self._wake.clear()
+            try:
+                if self._reload_due():
+                    requested, self._reload_requested = self._reload_requested, False
+                    if not requested and self._version_unchanged():
+                        # Nothing changed since the last load: keep the (possibly memory-mapped) gallery.
+                        self.last_load_time = datetime.utcnow()
+                        continue
+                    with self._load_lock:
+                        self._load_full(self._sync_db)
+                else:
+                    changed, removed = self.sync_delta(self._sync_db)
+                    if changed or removed:
+                        print(f"[ANTIGRAVITY] [SYNC] Delta sync: {changed} updated, {removed} removed.")
+            except Exception as e:
+                print(f"[ERROR] Background gallery sync failed: {e}")
+
+    def _build_session_entry(self, class_name: Optional[str], source: FaceGallery, touched_at: datetime) -> Dict:
+        members = [i for i, u in enumerate(source.users) if class_name and u.get("class") == class_name]
+        return {
+            "class": class_name,
+            "source": source,
+            "gallery": source.subset(members),
+            "touched_at": touched_at,
+        }
+
+    def _rebuild_session_galleries(self):
+        """
+        Re-derive class galleries of active sessions from a freshly loaded snapshot
+        (caller holds self._lock), so requests never rebuild them inline.
+        """
+        source = self.gallery
+        for sid, entry in list(self.session_galleries.items()):
+            if entry["source"] is not source:
+                self.session_galleries[sid] = self._build_session_entry(entry["class"], source, entry["touched_at"])
+
+    def prepare_session(self, session_id: str, class_name: Optional[str], db=None) -> FaceGallery:
+        """Precompute the candidate gallery (students of `class_name`) for a session."""
+        if db is not None:
+            self.refresh_database(db)
+        now = datetime.utcnow()
+        stale = [
+            sid for sid, entry in list(self.session_galleries.items())
+            if (now - entry["touched_at"]).total_seconds() > SESSION_GALLERY_TTL_SECONDS
+        ]
+        for sid in stale:
+            self.session_galleries.pop(sid, None)
+        idle_trackers = [
+            sid for sid, tracker in list(self.trackers.items())
+            if time.monotonic() - tracker.touched_at > SESSION_GALLERY_TTL_SECONDS
+        ]
+        for sid in idle_trackers:
+            self.trackers.pop(sid, None)
+
+        # Built under the writers' lock so no upsert can slip in between the copy and the insert.
+        with self._lock:
+            entry = self._build_session_entry(class_name, self.gallery, now)
+            self.session_galleries[session_id] = entry
+            while len(self.session_galleries) > MAX_ACTIVE_SESSIONS:
+                oldest = min(self.session_galleries, key=lambda sid: self.session_galleries[sid]["touched_at"])
+                self.session_galleries.pop(oldest, None)
+        return entry["gallery"]
+
+    def release_session(self, session_id: str):
+        self.session_galleries.pop(session_id, None)
+        self.trackers.pop(session_id, None)
+
+    def _tracker(self, session_id: Optional[str]) -> Optional[FaceTracker]:
+        if not session_id or not Config.FACE_TRACK_ENABLED:
             return None
-        query_embeddings = query_result.get("embeddings", {})
-        bbox = query_result.get("bbox", {"x": 0, "y": 0, "w": 0, "h": 0})
+        tracker = self.trackers.get(session_id)
+        if tracker is None:
+            with self._lock:
+                tracker = self.trackers.setdefault(
+                    session_id,
+                    FaceTracker(
+                        lock_frames=Config.FACE_TRACK_LOCK_FRAMES,
+                        lock_seconds=Config.FACE_TRACK_LOCK_SECONDS,
+                        min_iou=Config.FACE_TRACK_MIN_IOU,
+                        max_idle_seconds=Config.FACE_TRACK_MAX_IDLE_SECONDS,
+                    ),
+                )
+                while len(self.trackers) > MAX_ACTIVE_SESSIONS:
+                    oldest = min(self.trackers, key=lambda sid: self.trackers[sid].touched_at)
+                    self.trackers.pop(oldest, None)
+        return tracker
 
-        # 2. Match against Database
-        best_match = None
-        best_avg_conf = 0.0
-
-        for user_rec in self.database:
-            user_confs = []
-            
-            # Compare each available model (Facenet512 only in this pipeline)
-            for model_name, query_vec in query_embeddings.items():
-                if model_name in user_rec["embeddings"]:
-                    prototype_vecs = (
-                        user_rec.get("prototypes", {}).get(model_name)
-                        or [user_rec["embeddings"][model_name]]
-                    )
-                    dist = min(cosine_distance(query_vec, proto) for proto in prototype_vecs)
-                    
-                    # Convert to % based on model-specific threshold
-                    thresh = THRESHOLDS.get(model_name, 0.5)
-                    conf = distance_to_percent(dist, thresh)
-                    user_confs.append(conf)
-            
-            if not user_confs: continue
-
-            # Ensemble Score: Average confidence across models
-            avg_conf = sum(user_confs) / len(user_confs)
-            
-            if avg_conf > best_avg_conf:
-                best_avg_conf = avg_conf
-                best_match = user_rec
+    def pin_present(self, session_id: str, user_id: str):
+        """A student marked present keeps their track locked (no more inference for that face)."""
+        tracker = self.trackers.get(session_id)
+        if tracker is not None:
+            tracker.pinned.add(str(user_id))
 
-        # 3. Decision Logic
+    def identity_conflicts(self, db, embedding, threshold: float, top_k: int,
+                           exclude_user_id: Optional[str] = None) -> List[Dict]:
+        """
+        Registered users (other than `exclude_user_id`) whose best prototype is at least
+        `threshold` cosine-similar to `embedding`, closest first, at most `top_k`.
+        One matrix product over the in-memory gallery. A delta sync first pulls users that
+        other workers registered since the last sync (an indexed, watermark-bounded query),
+        so no collection scan runs per check; if it fails, the check uses this worker's
+        gallery, which lags other workers by at most DELTA_SYNC_INTERVAL seconds.
+        """
+        self.refresh_database(db)
+        try:
+            self.sync_delta(db)
+        except Exception as e:
+            print(f"[ERROR] Delta sync before identity check failed: {e}")
+        gallery = self.gallery
+        mask = None
+        if exclude_user_id and exclude_user_id in gallery.positions:
+            mask = gallery.alive.copy()
+            mask[gallery.positions[exclude_user_id]] = False
+        return [
+            {
+                "userId": gallery.users[i]["user_id"],
+                "name": gallery.users[i].get("name"),
+                "rollNo": gallery.users[i].get("rollNo"),
+                "role": gallery.users[i].get("role"),
+                "similarity": round(sim, 4),
+            }
+            for i, sim in gallery.top_k(embedding, top_k, threshold, mask)
+        ]
+
+    def gallery_stats(self) -> Dict:
+        """Size of the live gallery plus timing/bytes of the last full load."""
+        gallery = self.gallery
+        return {"users": len(gallery), "prototypes": gallery.num_prototypes, "lastLoad": self.load_stats}
+
+    def tracking_stats(self) -> Dict:
+        """Per-session tracker counters, including the share of faces that skipped inference."""
+        return {sid: tracker.stats() for sid, tracker in list(self.trackers.items())}
+
+    def _session_gallery(self, session_id: str, class_name: Optional[str]) -> FaceGallery:
+        entry = self.session_galleries.get(session_id)
+        # Kept current by the write path (_apply_changes / _load_full); only a new
+        # session or a class change builds one here.
+        if entry is None or entry["class"] != class_name:
+            return self.prepare_session(session_id, class_name)
+        entry["touched_at"] = datetime.utcnow()
+        return entry["gallery"]
+
+    def _search(self, gallery: FaceGallery, query_vec):
+        """
+        Return (user index, confidence) of the best match in `gallery`.
+        Approximate indexes only propose candidates; they are re-ranked exactly and,
+        if none clears ENSEMBLE_THRESHOLD, the full gallery is scanned so the
+        matched/unmatched decision is the same as exact search.
+        """
+        thresh = THRESHOLDS.get(MODEL_NAME, 0.5)
+        index = gallery.index
+        if index is not None and index.approximate:
+            candidates = index.candidates(query_vec, Config.FACE_ANN_TOP_K)
+            idx, sim = gallery.best_among(query_vec, candidates)
+            if idx is not None:
+                conf = distance_to_percent(1.0 - max(-1.0, min(1.0, sim)), thresh)
+                if conf >= ENSEMBLE_THRESHOLD:
+                    return idx, conf
+
+        idx, sim = gallery.best_match(query_vec)
+        if idx is None:
+            return None, 0.0
+        return idx, distance_to_percent(1.0 - max(-1.0, min(1.0, sim)), thresh)
+
+    def _search_many(self, gallery: FaceGallery, query_vecs: List) -> List[Tuple[Optional[int], float]]:
+        """Batched _search: exact galleries score every query with one mat-mat product."""
+        index = gallery.index
+        if len(query_vecs) == 1 or (index is not None and index.approximate):
+            return [self._search(gallery, q) for q in query_vecs]
+
+        thresh = THRESHOLDS.get(MODEL_NAME, 0.5)
+        per_user = gallery.user_similarities(np.asarray(query_vecs, dtype=np.float32))
+        best = np.argmax(per_user, axis=1)
+        return [
+            (int(b), distance_to_percent(1.0 - max(-1.0, min(1.0, float(per_user[row, b]))), thresh))
+            for row, b in enumerate(best)
+        ]
+
+    def _match(self, query_vecs: List, session_id: Optional[str], class_name: Optional[str]) -> List[Tuple[Optional[Dict], float]]:
+        """Best (user, confidence) per query vector."""
+        # Students of the session's class are searched first; the global gallery is
+        # only consulted for queries nobody in the class clears the threshold for.
+        galleries = []
+        if session_id and class_name:
+            galleries.append(self._session_gallery(session_id, class_name))
+        galleries.append(self.gallery)
+
+        results = [(None, 0.0)] * len(query_vecs)
+        pending = [i for i, q in enumerate(query_vecs) if q is not None]
+        for gallery in galleries:
+            if not pending or not len(gallery):
+                continue
+            matches = self._search_many(gallery, [query_vecs[i] for i in pending])
+            for i, (idx, conf) in zip(pending, matches):
+                if idx is not None and conf > results[i][1]:
+                    results[i] = (gallery.users[idx], conf)
+            pending = [i for i in pending if results[i][1] < ENSEMBLE_THRESHOLD]
+        return results
+
+    def _output(self, best_match: Optional[Dict], best_avg_conf: float, bbox) -> Dict:
         output = {
             "matched": False,
             "user_id": None,
@@ -165,6 +486,95 @@ class MultiModelRecognizer:
 
         return output
 
+    def recognize_face(
+        self,
+        image_bytes: bytes,
+        db,
+        session_id: Optional[str] = None,
+        class_name: Optional[str] = None,
+    ) -> Optional[Dict]:
+        # Ensure DB is fresh
+        self.refresh_database(db)
+
+        # Decode once (callers that also run liveness pass a PreparedFrame)
+        frame = image_bytes if isinstance(image_bytes, PreparedFrame) else prepare_frame(image_bytes)
+        if frame is None: return None
+
+        boxes = ml_service.detect_faces(frame, max_faces=1)
+        if not boxes:
+            return None
+
+        # 1. A face still locked to a student in this session skips embedding entirely
+        tracker = self._tracker(session_id)
+        if tracker is not None:
+            [cached] = tracker.lookup([frame.to_source(boxes[0])])
+            if cached is not None:
+                return cached
+
+        [query_result] = ml_service.embed_regions(frame, boxes)
+        if not query_result:
+            return None
+        query_embeddings = query_result.get("embeddings", {})
+        bbox = query_result.get("bbox", {"x": 0, "y": 0, "w": 0, "h": 0})
+
+        # 2. Match against the prototype matrix (one mat-vec product for all users)
+        [(best_match, best_avg_conf)] = self._match([query_embeddings.get(MODEL_NAME)], session_id, class_name)
+
+        # 3. Decision Logic
+        output = self._output(best_match, best_avg_conf, bbox)
+        if tracker is not None:
+            tracker.update([output])
+        return output
+
+    def recognize_faces(
+        self,
+        image_bytes: bytes,
+        db,
+        session_id: Optional[str] = None,
+        class_name: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Multi-face recognition: faces not covered by a locked track are embedded in one
+        batch and matched in one pass. A student can only be matched once per frame;
+        weaker duplicate matches are reported as unknown.
+        """
+        self.refresh_database(db)
+
+        frame = image_bytes if isinstance(image_bytes, PreparedFrame) else prepare_frame(image_bytes)
+        if frame is None:
+            return []
+
+        boxes = ml_service.detect_faces(frame)
+        if not boxes:
+            return []
+
+        tracker = self._tracker(session_id)
+        outputs = tracker.lookup([frame.to_source(b) for b in boxes]) if tracker is not None else [None] * len(boxes)
+        todo = [i for i, out in enumerate(outputs) if out is None]
+        fresh = []
+        if todo:
+            query_results = ml_service.embed_regions(frame, [boxes[i] for i in todo])
+            embedded = [(i, q) for i, q in zip(todo, query_results) if q is not None]
+            if embedded:
+                query_vecs = [q.get("embeddings", {}).get(MODEL_NAME) for _, q in embedded]
+                matches = self._match(query_vecs, session_id, class_name)
+                for (i, q), (user, conf) in zip(embedded, matches):
+                    outputs[i] = self._output(user, conf, q.get("bbox", {"x": 0, "y": 0, "w": 0, "h": 0}))
+                fresh = [i for i, _ in embedded]
+
+        claimed = set()
+        live = [i for i, out in enumerate(outputs) if out is not None]
+        for i in sorted(live, key=lambda i: outputs[i]["confidence"], reverse=True):
+            if not outputs[i]["matched"]:
+                continue
+            if outputs[i]["user_id"] in claimed:
+                outputs[i] = self._output(None, outputs[i]["confidence"], outputs[i]["bbox"])
+            else:
+                claimed.add(outputs[i]["user_id"])
+        if tracker is not None and fresh:
+            tracker.update([outputs[i] for i in fresh])
+        return [outputs[i] for i in live]
+
 # Singleton
 _recognizer = None
 
@@ -4,12 +4,14 @@ import os
 import cv2
 import base64
 import numpy as np
+from bson import ObjectId
 from pathlib import Path
-from deepface import DeepFace
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from app.config import Config
 from app.models.user import User
+from app.services.face_recognition_simple import get_recognizer
+from app.services.ml_service import ml_service
 
 # ===================== CONFIG =====================
 MODEL_NAME = "Facenet512"
@@ -39,6 +41,7 @@ class FaceService:
     def _load_model(self):
         """Lazy load the FaceNet512 model."""
         if self.model is None:
+            from deepface import DeepFace
             print(f"[INFO] Loading {MODEL_NAME} model...")
             self.model = DeepFace.build_model(MODEL_NAME)
         return self.model
@@ -59,7 +62,12 @@ class FaceService:
         return max(0.0, min(100.0, percent))
 
     def _get_embedding(self, image_input, model_name: str = None):
-        """Get face embedding from image bytes or numpy array."""
+        """
+        Get a normalized face embedding from image bytes or a BGR numpy array.
+        Facenet512 goes through ml_service.generate_embedding, i.e. the same detector and
+        padded crop as multi-frame registration and live recognition, so the vector can
+        sit in the shared gallery. Returns None when no face is detected.
+        """
         try:
             if model_name is None:
                 model_name = MODEL_NAME
@@ -70,27 +78,20 @@ class FaceService:
                 img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                 if img is None:
                     return None
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
             else:
-                # Assume it's already a numpy array
-                if len(image_input.shape) == 3 and image_input.shape[2] == 3:
-                    img_rgb = cv2.cvtColor(image_input, cv2.COLOR_BGR2RGB)
-                else:
-                    img_rgb = image_input
+                img = image_input
 
-            # Get face embedding
-            objs = DeepFace.represent(
-                img_path=img_rgb,
-                model_name=model_name,
-                enforce_detection=False
-            )
+            if model_name != MODEL_NAME:
+                from deepface import DeepFace
+                objs = DeepFace.represent(img_path=img, model_name=model_name, enforce_detection=False)
+                if not objs:
+                    return None
+                return np.array(objs[0]["embedding"] if isinstance(objs, list) else objs["embedding"])
 
-            if not objs:
+            result = ml_service.generate_embedding(img)
+            if not result:
                 return None
-
-            if isinstance(objs, list):
-                return np.array(objs[0]["embedding"])
-            return np.array(objs["embedding"])
+            return np.asarray(result["embeddings"][MODEL_NAME], dtype=np.float32)
 
         except Exception as e:
             print(f"Error getting embedding: {str(e)}")
@@ -138,14 +139,8 @@ class FaceService:
             # Get the largest face
             x, y, w, h = max(faces, key=lambda rect: rect[2] * rect[3])
 
-            # Extract face region with some padding
-            padding = int(max(w, h) * 0.2)
-            x1 = max(0, x - padding)
-            y1 = max(0, y - padding)
-            x2 = min(img.shape[1], x + w + padding)
-            y2 = min(img.shape[0], y + h + padding)
-
-            face_img = img[y1:y2, x1:x2]
+            # Extract face region with the same padding as the embedding pipeline
+            face_img = ml_service.crop_face(img, (x, y, w, h))
 
             # Resize to target size
             face_img = cv2.resize(face_img, target_size)
@@ -157,27 +152,11 @@ class FaceService:
             return None
 
     def extract_face_embedding(self, face_img, model_name=MODEL_NAME):
-        """Extract face embedding from a cropped face image."""
+        """Extract face embedding from a cropped (BGR) face image."""
         try:
-            # Convert to RGB if needed
-            if len(face_img.shape) == 3 and face_img.shape[2] == 3:
-                face_img_rgb = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-            else:
-                face_img_rgb = face_img
-
-            # Get embedding
-            embedding_obj = DeepFace.represent(
-                img_path=face_img_rgb,
-                model_name=model_name,
-                enforce_detection=False
-            )
-
-            if isinstance(embedding_obj, list):
-                embedding = embedding_obj[0]['embedding']
-            else:
-                embedding = embedding_obj['embedding']
-
-            return np.array(embedding)
+            if model_name != MODEL_NAME:
+                return self._get_embedding(face_img, model_name)
+            return ml_service.embed_batch([face_img])[0]
 
         except Exception as e:
             print(f"Error extracting embedding: {str(e)}")
@@ -252,6 +231,8 @@ class FaceService:
 
             detected_faces = []
 
+            # Pass 1: assign track ids so unlocked faces can be embedded in a single batch.
+            tracked = []
             for (x, y, w, h) in faces:
                 face_img = frame[y:y+h, x:x+w]
 
@@ -275,15 +256,23 @@ class FaceService:
                         "box": (x, y, w, h)
                     }
 
+                self.tracked_faces[face_id]["box"] = (x, y, w, h)
+                tracked.append((face_id, face_img, (x, y, w, h)))
+
+            to_embed = [i for i, (fid, _, _) in enumerate(tracked) if self.tracked_faces[fid]["lock"] <= 0]
+            crops = [ml_service.crop_face(frame, tracked[i][2]) for i in to_embed]
+            batch = ml_service.embed_batch(crops) if crops else []
+            embeddings = dict(zip(to_embed, batch))
+
+            for i, (face_id, face_img, (x, y, w, h)) in enumerate(tracked):
                 face_data = self.tracked_faces[face_id]
-                face_data["box"] = (x, y, w, h)
 
                 # Identity recognition
                 if face_data["lock"] > 0:
                     face_data["lock"] -= 1
                 else:
-                    embedding = self._get_embedding(face_img, MODEL_NAME)
-                    
+                    embedding = embeddings.get(i)
+
                     if embedding is not None and len(self.face_database) > 0:
                         best_name = "Unknown"
                         best_user_id = None
@@ -310,6 +299,7 @@ class FaceService:
                 # Emotion detection (throttled)
                 if analyze_emotion and self.frame_idx % EMOTION_INTERVAL == 0:
                     try:
+                        from deepface import DeepFace
                         emo = DeepFace.analyze(
                             face_img,
                             actions=["emotion"],
@@ -341,52 +331,46 @@ class FaceService:
             return {"success": False, "error": str(e)}
 
     def register_face(self, image_bytes: bytes, user_id: str, user_role: str, exclude_user_id: str = None):
-        """Validate single face, get encoding, check duplicate against all other users."""
+        """
+        Validate single face, get encoding, check duplicate against all other users.
+        On a duplicate, `conflicts` lists the closest users (top FACE_DUPLICATE_TOP_K) for auditing.
+        """
         emb = self._get_embedding(image_bytes, MODEL_NAME)
         if emb is None:
             return {"success": False, "error": "No face detected or invalid image"}
 
-        # Duplicate check: compare with every other user's encoding
-        users = User.collection(self.db).find({"faceRegistered": True, "faceEncoding": {"$exists": True}})
-        for u in users:
-            if exclude_user_id and str(u["_id"]) == exclude_user_id:
-                continue
-            enc = u.get("faceEncoding")
-            if not enc:
-                continue
-            sim = self._cosine_similarity(emb, enc)
-            if sim >= self.duplicate_threshold:
-                return {"success": False, "error": "Face already registered for another user"}
+        # Duplicate check: one product against every other user's prototypes
+        conflicts = get_recognizer().identity_conflicts(
+            self.db, emb, self.duplicate_threshold, Config.FACE_DUPLICATE_TOP_K, exclude_user_id=exclude_user_id
+        )
+        if conflicts:
+            print(f"[AUDIT] Duplicate face for user {user_id}: {conflicts}")
+            return {"success": False, "error": "Face already registered for another user", "conflicts": conflicts}
 
         return {"success": True, "encoding": emb.tolist()}
 
     def verify(self, image_bytes: bytes):
-        """Get face from image, compare with all registered encodings."""
+        """Get face from image, compare with all registered students' prototypes."""
         emb = self._get_embedding(image_bytes, MODEL_NAME)
         if emb is None:
             return {"matched": False, "error": "No face detected"}
 
-        users = User.collection(self.db).find({"faceRegistered": True, "faceEncoding": {"$exists": True}, "role": "student"})
-        best_sim = -1
-        best_user = None
-        for u in users:
-            enc = u.get("faceEncoding")
-            if not enc:
-                continue
-            sim = self._cosine_similarity(emb, enc)
-            if sim >= self.threshold and sim > best_sim:
-                best_sim = sim
-                best_user = u
-
-        if best_user is None:
+        recognizer = get_recognizer()
+        recognizer.refresh_database(self.db)
+        gallery = recognizer.gallery
+        best = gallery.top_k(emb, 1, self.threshold, gallery.role_mask(User.ROLE_STUDENT))
+        if not best:
             return {"matched": False}
 
+        idx, best_sim = best[0]
+        best_user = gallery.users[idx]
+        doc = User.collection(self.db).find_one({"_id": ObjectId(best_user["user_id"])}, {"email": 1})
         return {
             "matched": True,
             "confidence": float(best_sim),
             "user": {
-                "id": str(best_user["_id"]),
+                "id": best_user["user_id"],
                 "name": best_user.get("name"),
-                "email": best_user.get("email"),
+                "email": doc.get("email") if doc else None,
             },
         }
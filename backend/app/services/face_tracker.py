@@ -0,0 +1,126 @@
+"""Per-session IoU face tracker: reuse a confirmed identity instead of re-embedding every frame."""
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+def bbox_iou(a, b):
+    if not a or not b:
+        return 0.0
+    ax1, ay1, aw, ah = a["x"], a["y"], a["w"], a["h"]
+    bx1, by1, bw, bh = b["x"], b["y"], b["w"], b["h"]
+    ax2, ay2 = ax1 + aw, ay1 + ah
+    bx2, by2 = bx1 + bw, by1 + bh
+
+    ix1, iy1 = max(ax1, bx1), max(ay1, by1)
+    ix2, iy2 = min(ax2, bx2), min(ay2, by2)
+    iw, ih = max(0, ix2 - ix1), max(0, iy2 - iy1)
+    inter = iw * ih
+    if inter <= 0:
+        return 0.0
+
+    a_area = max(1, aw * ah)
+    b_area = max(1, bw * bh)
+    return float(inter / max(1.0, a_area + b_area - inter))
+
+
+class FaceTracker:
+    """
+    Tracks faces across one session's frames by box overlap.
+    - A track is locked once its face is matched to a student; while locked, a box that
+      overlaps it (IoU >= `min_iou`) reuses the cached identity and skips Facenet512
+    - The lock lasts `lock_frames` reuses or `lock_seconds`, whichever ends first; a box
+      that jumps (low IoU) or an unmatched face is always re-embedded
+    - Tracks of `pinned` students (already marked present) stay locked until the box
+      jumps or goes idle, since nothing more is decided for them
+    - Tracks not seen for `max_idle_seconds` are dropped
+    """
+
+    def __init__(self, lock_frames: int, lock_seconds: float, min_iou: float, max_idle_seconds: float):
+        self.lock_frames = lock_frames
+        self.lock_seconds = lock_seconds
+        self.min_iou = min_iou
+        self.max_idle_seconds = max_idle_seconds
+        self.tracks: List[Dict] = []
+        self.pinned = set()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.faces = 0
+        self.skipped = 0
+        self.touched_at = time.monotonic()
+
+    def _pair(self, bboxes, now) -> List[Optional[Dict]]:
+        """Greedy best-IoU pairing of boxes to live tracks."""
+        self.tracks = [t for t in self.tracks if now - t["last_seen"] <= self.max_idle_seconds]
+        pairs = sorted(
+            (
+                (bbox_iou(bbox, track["bbox"]), i, j)
+                for i, bbox in enumerate(bboxes)
+                for j, track in enumerate(self.tracks)
+            ),
+            reverse=True,
+        )
+        assigned: List[Optional[Dict]] = [None] * len(bboxes)
+        used = set()
+        for iou, i, j in pairs:
+            if iou < self.min_iou:
+                break
+            if assigned[i] is None and j not in used:
+                assigned[i] = self.tracks[j]
+                used.add(j)
+        return assigned
+
+    def lookup(self, bboxes: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Cached recognition output for each box whose track is still locked, else None
+        (those boxes need embedding). Boxes are in the same pixel space as the outputs.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.frames += 1
+            self.faces += len(bboxes)
+            self.touched_at = now
+            cached: List[Optional[Dict]] = []
+            for bbox, track in zip(bboxes, self._pair(bboxes, now)):
+                if track is None:
+                    cached.append(None)
+                    continue
+                if track["output"].get("user_id") not in self.pinned:
+                    if track["remaining"] <= 0 or now >= track["expires"]:
+                        cached.append(None)
+                        continue
+                    track["remaining"] -= 1
+                track["bbox"] = bbox
+                track["last_seen"] = now
+                self.skipped += 1
+                cached.append(dict(track["output"], bbox=bbox, tracked=True))
+            return cached
+
+    def update(self, outputs: List[Dict]):
+        """Record freshly recognized faces: matched ones (re)lock their track."""
+        now = time.monotonic()
+        with self._lock:
+            bboxes = [o.get("bbox") for o in outputs]
+            for output, track in zip(outputs, self._pair(bboxes, now)):
+                if track is None:
+                    track = {"bbox": output.get("bbox")}
+                    self.tracks.append(track)
+                track.update(
+                    {
+                        "bbox": output.get("bbox"),
+                        "output": dict(output),
+                        "last_seen": now,
+                        "remaining": self.lock_frames if output.get("matched") else 0,
+                        "expires": now + self.lock_seconds,
+                    }
+                )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "faces": self.faces,
+                "skipped": self.skipped,
+                "skipRatio": round(self.skipped / max(1, self.faces), 3),
+                "tracks": len(self.tracks),
+            }
@@ -0,0 +1,172 @@
+"""Decode-once frame preprocessing shared by detection, embedding, liveness and quality checks."""
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.config import Config
+
+HAAR_MIN_FACE = 80          # detectMultiScale minSize at working resolution
+HAAR_WINDOW = 24            # the cascade can't find anything smaller than its window
+LIVENESS_THUMB_SIZE = (48, 48)
+
+_REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+# SOFn markers carry the frame size; C4/C8/CC are DHT/JPG/DAC.
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG header without decoding it; None if not a parsable JPEG."""
+    n = len(data)
+    if n < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker in _JPEG_SOF:
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return (width, height) if width and height else None
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+class PreparedFrame:
+    """
+    One decoded frame plus the derived views every stage needs, each computed once:
+    - `image`: BGR working image (possibly decoded at reduced resolution)
+    - `gray`: grayscale of the working image (quality checks)
+    - `detection_gray`/`detection_scale`: downscaled grayscale for Haar detection
+    - `thumbnail`: 48x48 grayscale for liveness motion checks
+    Boxes are in working-image pixels; `to_source` maps them to the uploaded image, using
+    `source_scale` = (x, y) uploaded pixels per working-image pixel.
+    """
+
+    def __init__(self, image: np.ndarray, source_scale: Tuple[float, float] = (1.0, 1.0)):
+        self.image = image
+        self.source_scale = source_scale
+        self._gray = None
+        self._detection = None
+        self._thumbnail = None
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def _detection_view(self):
+        if self._detection is None:
+            gray = self.gray
+            longest = max(gray.shape[:2])
+            scale = min(1.0, Config.FRAME_DETECT_MAX_SIDE / float(max(1, longest)))
+            if scale < 1.0:
+                size = (max(1, int(round(gray.shape[1] * scale))), max(1, int(round(gray.shape[0] * scale))))
+                small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+            else:
+                small = gray
+            self._detection = (small, scale)
+        return self._detection
+
+    @property
+    def detection_gray(self) -> np.ndarray:
+        return self._detection_view()[0]
+
+    @property
+    def detection_scale(self) -> float:
+        return self._detection_view()[1]
+
+    @property
+    def thumbnail(self) -> np.ndarray:
+        if self._thumbnail is None:
+            self._thumbnail = cv2.resize(self.detection_gray, LIVENESS_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        return self._thumbnail
+
+    def detect_faces(self, cascade, scale_factor: float = 1.2, min_neighbors: int = 6):
+        """Haar detection on the downscaled view; boxes mapped back to working-image pixels, largest first."""
+        small, scale = self._detection_view()
+        min_side = max(HAAR_WINDOW, int(round(HAAR_MIN_FACE * scale)))
+        faces = cascade.detectMultiScale(
+            small,
+            scaleFactor=scale_factor,
+            minNeighbors=min_neighbors,
+            minSize=(min_side, min_side),
+        )
+        ih, iw = self.image.shape[:2]
+        boxes = []
+        for x, y, w, h in faces:
+            x1, y1 = int(round(x / scale)), int(round(y / scale))
+            w1 = min(iw - x1, int(round(w / scale)))
+            h1 = min(ih - y1, int(round(h / scale)))
+            boxes.append((x1, y1, w1, h1))
+        return sorted(boxes, key=lambda f: f[2] * f[3], reverse=True)
+
+    def to_source(self, bbox: Tuple[int, int, int, int]) -> Dict:
+        """Working-image box -> {"x","y","w","h"} in the uploaded image's pixels."""
+        sx, sy = self.source_scale
+        x, y, w, h = bbox
+        return {"x": int(round(x * sx)), "y": int(round(y * sy)), "w": int(round(w * sx)), "h": int(round(h * sy))}
+
+    def from_source(self, box: Dict) -> Tuple[int, int, int, int]:
+        """{"x","y","w","h"} in the uploaded image's pixels -> working-image box."""
+        sx, sy = self.source_scale
+        return int(box["x"] / sx), int(box["y"] / sy), int(box["w"] / sx), int(box["h"] / sy)
+
+
+def prepare_image(image) -> Optional[PreparedFrame]:
+    """Wrap an already-decoded BGR array (or pass a PreparedFrame through)."""
+    if isinstance(image, PreparedFrame):
+        return image
+    if not isinstance(image, np.ndarray) or image.size == 0:
+        return None
+    return PreparedFrame(image)
+
+
+def prepare_frame(image_bytes) -> Optional[PreparedFrame]:
+    """
+    Decode an uploaded frame once. Large JPEGs are decoded with IMREAD_REDUCED_COLOR_{2,4,8}
+    (DCT-domain downscaling) as long as the result keeps at least FRAME_DECODE_MAX_SIDE pixels
+    on its longest side.
+    Both decodes apply EXIF orientation, so a rotated photo comes back with its axes swapped
+    relative to the SOF header; the per-axis scale is taken against the oriented size.
+    """
+    if image_bytes is None or len(image_bytes) == 0:
+        return None
+    buf = np.frombuffer(image_bytes, np.uint8)
+
+    flag, factor = cv2.IMREAD_COLOR, 1
+    size = jpeg_size(image_bytes)
+    if size is not None:
+        longest = max(size)
+        for f in (8, 4, 2):
+            if longest / f >= Config.FRAME_DECODE_MAX_SIDE:
+                flag, factor = _REDUCED_FLAGS[f], f
+                break
+
+    image = cv2.imdecode(buf, flag)
+    if image is None:
+        return None
+    if factor == 1:
+        return PreparedFrame(image)
+    width, height = size
+    h, w = image.shape[:2]
+    # The reduced decode is ceil(side / factor) per axis; pick whichever orientation fits.
+    if abs(w - width / factor) + abs(h - height / factor) > abs(w - height / factor) + abs(h - width / factor):
+        width, height = height, width
+    return PreparedFrame(image, source_scale=(width / w, height / h))
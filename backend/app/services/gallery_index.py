@@ -0,0 +1,132 @@
+"""Candidate search indexes over a FaceGallery (exact scan or NumPy IVF)."""
+import logging
+from typing import Optional
+
+import numpy as np
+
+from app.config import Config
+from app.services.face_gallery import FaceGallery, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+SEARCH_EXACT = "exact"
+SEARCH_IVF = "ivf"
+
+
+class ExactIndex:
+    """Brute-force search: every user is a candidate."""
+
+    approximate = False
+
+    def __init__(self, gallery: FaceGallery):
+        self.gallery = gallery
+
+    def candidates(self, query, k: int) -> np.ndarray:
+        per_user = self.gallery.user_similarities(query)
+        k = min(k, len(per_user))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-per_user, k - 1)[:k]
+        return top[np.argsort(-per_user[top])]
+
+
+class IVFIndex:
+    """
+    Inverted-file index built with spherical k-means in pure NumPy.
+    - Prototype rows are bucketed under their nearest centroid
+    - A query scans only the `nprobe` closest buckets
+    - Returns the top-k users by their best probed row; callers re-rank exactly
+    """
+
+    approximate = True
+
+    def __init__(
+        self,
+        gallery: FaceGallery,
+        nlist: int,
+        nprobe: int,
+        iters: int = 10,
+        seed: int = 0,
+        centroids: Optional[np.ndarray] = None,
+        known_assign: Optional[np.ndarray] = None,
+    ):
+        self.gallery = gallery
+        if centroids is None:
+            self.nlist = max(1, min(nlist, gallery.num_prototypes))
+            centroids = self._train(gallery.matrix, self.nlist, iters, seed)
+        else:
+            self.nlist = centroids.shape[0]
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        self.centroids = centroids
+
+        # Rows covered by `known_assign` are unchanged; only the appended ones are scored.
+        done = 0 if known_assign is None else len(known_assign)
+        fresh = np.argmax(gallery.matrix[done:] @ self.centroids.T, axis=1)
+        assign = fresh if known_assign is None else np.concatenate([known_assign, fresh])
+        self.assign = assign
+        self.list_rows = np.argsort(assign, kind="stable").astype(np.int64)
+        sizes = np.bincount(assign, minlength=self.nlist)
+        self.list_offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+
+    @staticmethod
+    def _train(matrix: np.ndarray, nlist: int, iters: int, seed: int) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        # k-means on a bounded sample keeps build time flat for very large galleries.
+        sample_size = min(matrix.shape[0], nlist * 64)
+        sample = matrix[rng.choice(matrix.shape[0], size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def candidates(self, query, k: int) -> np.ndarray:
+        q = normalize_rows(query)[0]
+        probe = np.argpartition(-(self.centroids @ q), self.nprobe - 1)[: self.nprobe]
+        rows = np.concatenate(
+            [self.list_rows[self.list_offsets[c]: self.list_offsets[c + 1]] for c in probe]
+        )
+
+        sims = self.gallery.matrix[rows] @ q
+        users = self.gallery.row_user[rows]
+        best = np.full(len(self.gallery.users), -np.inf, dtype=np.float32)
+        np.maximum.at(best, users, sims)
+        best[~self.gallery.alive] = -np.inf     # removed users still have rows in the lists
+
+        hit = np.flatnonzero(best > -np.inf)
+        k = min(k, hit.size)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = hit[np.argpartition(-best[hit], k - 1)[:k]]
+        return top[np.argsort(-best[top])]
+
+
+def build_index(gallery: FaceGallery, mode: Optional[str] = None, previous=None):
+    """
+    Build the configured search index for `gallery`.
+    Small galleries always use exact search; IVF only pays off at scale.
+    Passing the `previous` IVF index reuses its centroids (rows are only re-bucketed),
+    and when `gallery` was appended from the previous one only the new rows are
+    assigned, which keeps incremental gallery updates cheap.
+    """
+    mode = (mode or Config.FACE_SEARCH_MODE).lower()
+    if mode != SEARCH_IVF or gallery.num_prototypes < Config.FACE_ANN_MIN_PROTOTYPES:
+        return ExactIndex(gallery)
+
+    if isinstance(previous, IVFIndex) and previous.centroids.shape[1] == gallery.matrix.shape[1]:
+        known = None
+        if gallery.extends(previous.gallery):
+            known = previous.assign
+        return IVFIndex(gallery, nlist=previous.nlist, nprobe=previous.nprobe,
+                        centroids=previous.centroids, known_assign=known)
+
+    nlist = Config.FACE_ANN_NLIST or int(np.sqrt(gallery.num_prototypes))
+    try:
+        return IVFIndex(gallery, nlist=nlist, nprobe=Config.FACE_ANN_NPROBE)
+    except Exception as ex:
+        logger.warning("IVF index build failed, using exact search: %s", ex)
+        return ExactIndex(gallery)
@@ -0,0 +1,131 @@
+"""
+Projection-limited gallery loading.
+
+MongoDB returns only `_id`, `name`, `rollNo`, `class`, `role` and a single `faces` field
+per user, picked server-side: non-empty embeddingPrototypes, else the first of
+embeddings.Facenet512 / embedding that exists (faceEncoding only with
+FACE_GALLERY_LEGACY_ENCODINGS), matching `stored_prototypes`. Documents are read raw (RawBSONDocument) so the bytes
+received can be counted without re-encoding, and prototypes are copied batch by batch
+straight into one preallocated float32 matrix.
+"""
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from app.config import Config
+from app.models.user import User
+from app.services.embedding_codec import decode_matrix
+from app.services.face_gallery import FaceGallery
+
+GALLERY_BATCH_SIZE = 500
+PROTOTYPES_PER_USER_GUESS = 4   # initial rows reserved per user; the buffer doubles if short
+GALLERY_FIELDS = ("name", "rollNo", "class", "role")
+
+# Nested $ifNull: the multi-argument form needs MongoDB 5.0.
+_BASE = {"$ifNull": [
+    "$embeddings.Facenet512",
+    {"$ifNull": ["$embedding", "$faceEncoding"]} if Config.FACE_GALLERY_LEGACY_ENCODINGS else "$embedding",
+]}
+# Prototypes are a compact Binary or a legacy array; an empty array falls back to the base.
+_HAS_PROTOTYPES = {"$cond": [
+    {"$isArray": "$embeddingPrototypes"},
+    {"$gt": [{"$size": "$embeddingPrototypes"}, 0]},
+    {"$ne": [{"$ifNull": ["$embeddingPrototypes", None]}, None]},
+]}
+_FACES = {"$cond": [_HAS_PROTOTYPES, "$embeddingPrototypes", _BASE]}
+_RAW = CodecOptions(document_class=RawBSONDocument)
+
+
+def gallery_pipeline(match: Dict, extra_fields=()) -> List[Dict]:
+    project = {"_id": 1, "faces": _FACES}
+    project.update({f: 1 for f in GALLERY_FIELDS + tuple(extra_fields)})
+    return [{"$match": match}, {"$project": project}]
+
+
+def _raw_cursor(db, match: Dict, batch_size: int, extra_fields=()):
+    collection = User.collection(db).with_options(codec_options=_RAW)
+    return collection.aggregate(gallery_pipeline(match, extra_fields), batchSize=batch_size)
+
+
+def _metadata(doc, extra_fields=()) -> Dict:
+    meta = {
+        "user_id": str(doc["_id"]),
+        "name": doc.get("name", "Unknown"),
+        "rollNo": doc.get("rollNo", ""),
+        "class": doc.get("class"),
+        "role": doc.get("role"),
+    }
+    for field in extra_fields:
+        meta[field] = doc.get(field)
+    return meta
+
+
+def _faces(doc) -> Optional[np.ndarray]:
+    try:
+        return decode_matrix(doc.get("faces"))
+    except (ValueError, TypeError):
+        return None
+
+
+def iter_records(db, match: Dict, batch_size: int = GALLERY_BATCH_SIZE, extra_fields=()) -> Iterator[Dict]:
+    """`user_record`-shaped dicts for every matching user, from the projected query."""
+    for doc in _raw_cursor(db, match, batch_size, extra_fields):
+        faces = _faces(doc)
+        if faces is not None:
+            yield dict(_metadata(doc, extra_fields), prototypes=faces)
+
+
+def load_gallery(db, match: Optional[Dict] = None, batch_size: int = GALLERY_BATCH_SIZE,
+                 extra_fields=()) -> Tuple[FaceGallery, Dict]:
+    """
+    Build a FaceGallery of every user matching `match` (default: faceRegistered).
+    Returns (gallery, stats) with users, prototypes, skipped docs, bytes received and seconds.
+    """
+    started = time.perf_counter()
+    match = {"faceRegistered": True} if match is None else match
+    expected = User.collection(db).count_documents(match)
+
+    matrix: Optional[np.ndarray] = None
+    rows = 0
+    users, counts = [], []
+    received = skipped = 0
+    for doc in _raw_cursor(db, match, batch_size, extra_fields):
+        received += len(doc.raw)
+        faces = _faces(doc)
+        if faces is None or faces.ndim != 2 or faces.shape[0] == 0:
+            skipped += 1
+            continue
+        n, dim = faces.shape
+        if matrix is None:
+            matrix = np.empty((max(n, expected * PROTOTYPES_PER_USER_GUESS), dim), dtype=np.float32)
+        elif dim != matrix.shape[1]:
+            skipped += 1
+            continue
+        if rows + n > matrix.shape[0]:
+            grown = np.empty((max(rows + n, 2 * matrix.shape[0]), dim), dtype=np.float32)
+            grown[:rows] = matrix[:rows]
+            matrix = grown
+        matrix[rows:rows + n] = faces       # float16/int8 -> float32 happens in this copy
+        rows += n
+        users.append(_metadata(doc, extra_fields))
+        counts.append(n)
+
+    if matrix is None or not users:
+        gallery = FaceGallery.empty()
+    else:
+        # Don't pin a mostly-empty buffer behind the view.
+        matrix = matrix[:rows].copy() if 2 * rows < matrix.shape[0] else matrix[:rows]
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9
+        gallery = FaceGallery(users, matrix, counts)
+
+    stats = {
+        "users": len(users),
+        "prototypes": rows,
+        "skipped": skipped,
+        "bytes": received,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+    return gallery, stats
@@ -0,0 +1,105 @@
+"""
+On-disk gallery snapshot, memory-mapped on startup.
+
+File layout (little-endian):
+    header   "<8sQIIIQQ": magic, gallery version, rows, dim, users, matrix offset, table offset
+    matrix   rows x dim float32, L2-normalized, starting on a page boundary
+    table    UTF-8 JSON {"users": [...], "counts": [...]} (row counts per user)
+Every worker maps the same file read-only, so they share one page-cache copy. The file
+holds every enrolled face embedding and is written with mode 0600.
+
+The gallery version is a counter in MongoDB (`settings` {"key": "faceGalleryVersion"})
+bumped on every face-data change; a snapshot is only used if it was written at the
+current version.
+"""
+import json
+import logging
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+from app.services.face_gallery import FaceGallery
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FGSNAP02"         # bumped whenever the user table gains fields
+HEADER = struct.Struct("<8sQIIIQQ")
+PAGE = 4096
+VERSION_KEY = "faceGalleryVersion"
+
+
+def _counters(db):
+    return db.settings
+
+
+def current_version(db) -> int:
+    doc = _counters(db).find_one({"key": VERSION_KEY}, {"version": 1})
+    return int(doc.get("version", 0)) if doc else 0
+
+
+def bump_version(db) -> None:
+    """Mark every snapshot written so far as stale."""
+    _counters(db).update_one({"key": VERSION_KEY}, {"$inc": {"version": 1}}, upsert=True)
+
+
+def snapshot_version(path: str) -> Optional[int]:
+    """Gallery version recorded in `path`, or None if there's no readable snapshot."""
+    try:
+        with open(path, "rb") as f:
+            magic, version, *_ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return version if magic == MAGIC else None
+
+
+def write_snapshot(path: str, gallery: FaceGallery, version: int) -> bool:
+    """Write `gallery` atomically (temp file + rename); readers never see a partial file."""
+    if not len(gallery):
+        return False
+    gallery = gallery.compacted()
+    matrix = np.ascontiguousarray(gallery.matrix, dtype="<f4")
+    table = json.dumps({"users": gallery.users, "counts": gallery.counts.tolist()}).encode("utf-8")
+    matrix_offset = PAGE
+    table_offset = matrix_offset + matrix.nbytes
+    header = HEADER.pack(MAGIC, version, matrix.shape[0], matrix.shape[1], len(gallery), matrix_offset, table_offset)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        # Biometric data: readable by the service user only.
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            f.write(header.ljust(matrix_offset, b"\0"))
+            f.write(matrix.tobytes())
+            f.write(table)
+        os.replace(tmp, path)
+        return True
+    except OSError as ex:
+        logger.warning("Gallery snapshot write to %s failed: %s", path, ex)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def read_snapshot(path: str, expected_version: int) -> Optional[FaceGallery]:
+    """Map the snapshot at `path` if it was written at `expected_version`, else None."""
+    try:
+        with open(path, "rb") as f:
+            magic, version, rows, dim, n_users, matrix_offset, table_offset = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != expected_version:
+                return None
+            if table_offset != matrix_offset + rows * dim * 4:
+                return None
+            f.seek(table_offset)
+            table = json.loads(f.read().decode("utf-8"))
+        counts = np.asarray(table["counts"], dtype=np.int64)
+        if len(table["users"]) != n_users or len(counts) != n_users or int(counts.sum()) != rows:
+            return None
+        matrix = np.memmap(path, dtype="<f4", mode="r", offset=matrix_offset, shape=(rows, dim))
+    except (OSError, ValueError, KeyError, struct.error) as ex:
+        logger.warning("Gallery snapshot %s unreadable: %s", path, ex)
+        return None
+    return FaceGallery(table["users"], matrix, counts)
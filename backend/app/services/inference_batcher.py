@@ -0,0 +1,111 @@
+"""In-process dynamic micro-batching for model forward passes."""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent inference requests into one forward pass.
+    - Callers `submit` an (n, ...) array and get a Future for its (n, ...) output rows
+    - A worker takes the first waiting request, then keeps collecting for up to
+      `max_wait_ms` or until `max_batch_size` rows are queued
+    - `fn` is called once on the concatenated batch and its rows are split back per caller
+    """
+
+    def __init__(self, fn: Callable[[np.ndarray], np.ndarray], max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._requests = 0
+        self._wait_total = 0.0
+        self._size_hist: Dict[int, int] = {}
+
+    def _ensure_worker(self):
+        # Started lazily so each gunicorn worker gets its own thread after fork.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, items: np.ndarray) -> Future:
+        future: Future = Future()
+        if len(items) == 0:
+            future.set_result(items[:0])
+            return future
+        self._ensure_worker()
+        self._queue.put((items, future, time.perf_counter()))
+        return future
+
+    def run(self, items: np.ndarray, timeout: float = 30.0) -> np.ndarray:
+        """Blocking submit: returns this caller's output rows."""
+        return self.submit(items).result(timeout=timeout)
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        rows = len(pending[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                req = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.append(req)
+            rows += len(req[0])
+        return pending, rows
+
+    def _run(self):
+        while True:
+            pending, rows = self._collect()
+            started = time.perf_counter()
+            try:
+                batch = pending[0][0] if len(pending) == 1 else np.concatenate([p[0] for p in pending])
+                outputs = np.asarray(self.fn(batch))
+            except Exception as ex:
+                logger.warning("Micro-batch of %d rows failed: %s", rows, ex)
+                for _, future, _ in pending:
+                    future.set_exception(ex)
+                continue
+
+            offset = 0
+            for items, future, _ in pending:
+                future.set_result(outputs[offset: offset + len(items)])
+                offset += len(items)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += rows
+                self._requests += len(pending)
+                self._wait_total += sum(started - enq for _, _, enq in pending)
+                self._size_hist[rows] = self._size_hist.get(rows, 0) + 1
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            batches = max(1, self._batches)
+            return {
+                "maxBatchSize": self.max_batch_size,
+                "maxWaitMs": round(self.max_wait * 1000.0, 2),
+                "batches": self._batches,
+                "requests": self._requests,
+                "items": self._items,
+                "avgBatchSize": round(self._items / batches, 2),
+                "avgRequestsPerBatch": round(self._requests / batches, 2),
+                "avgQueueWaitMs": round(self._wait_total * 1000.0 / max(1, self._requests), 3),
+                "batchSizeHistogram": {str(k): v for k, v in sorted(self._size_hist.items())},
+            }
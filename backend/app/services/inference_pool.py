@@ -0,0 +1,190 @@
+"""Out-of-process Facenet512 workers fed through shared memory.
+
+Web workers (gunicorn) stay lightweight: they preprocess crops, copy the float32
+batch into a `multiprocessing.shared_memory` block and send only its name over a
+local socket. A pool worker process that owns the model runs the forward pass and
+writes the embeddings back into the same block.
+"""
+import logging
+import queue
+import threading
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 512
+FLOAT_BYTES = 4
+LISTEN_BACKLOG = 128  # Listener defaults to 1, which stalls concurrent connects in the auth handshake
+REPLY_TIMEOUT_SECONDS = 30.0
+
+
+def pool_authkey() -> bytes:
+    """FACE_INFERENCE_POOL_AUTHKEY as bytes; the pool refuses to run without its own key."""
+    key = Config.FACE_INFERENCE_POOL_AUTHKEY
+    if not key or key == Config.JWT_SECRET:
+        raise RuntimeError("FACE_INFERENCE_POOL_AUTHKEY must be set (and differ from JWT_SECRET) to use the inference pool")
+    return key.encode("utf-8")
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # The client owns the block; stop this process's resource tracker from unlinking it on exit.
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class _Channel:
+    """One socket connection to a pool worker plus its reusable shared-memory buffer."""
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes):
+        self.conn = Client(address, authkey=authkey)
+        self.shm: Optional[shared_memory.SharedMemory] = None
+
+    def _buffer(self, size: int) -> shared_memory.SharedMemory:
+        if self.shm is None or self.shm.size < size:
+            self._release_buffer()
+            self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1 << 20))
+        return self.shm
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        n, h, w, c = batch.shape
+        in_bytes = batch.nbytes
+        shm = self._buffer(in_bytes + n * EMBEDDING_DIM * FLOAT_BYTES)
+        np.ndarray(batch.shape, dtype=np.float32, buffer=shm.buf)[:] = batch
+
+        self.conn.send((shm.name, n, h, w, c))
+        if not self.conn.poll(REPLY_TIMEOUT_SECONDS):
+            raise TimeoutError("Inference worker did not reply in time")
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Inference worker error: {payload}")
+        out = np.ndarray((n, payload), dtype=np.float32, buffer=shm.buf, offset=in_bytes)
+        return out.copy()
+
+    def _release_buffer(self):
+        if self.shm is not None:
+            try:
+                self.shm.close()
+                self.shm.unlink()
+            except Exception:
+                pass
+            self.shm = None
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self._release_buffer()
+
+
+class InferenceClient:
+    """
+    Thread-safe client for the pool. Idle channels are reused; new ones are opened
+    round-robin across the pool's worker ports.
+    """
+
+    def __init__(self, host: str, base_port: int, num_workers: int, authkey: bytes):
+        self.addresses = [(host, base_port + i) for i in range(max(1, num_workers))]
+        self.authkey = authkey
+        self._idle: "queue.Queue[_Channel]" = queue.Queue()
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> _Channel:
+        with self._lock:
+            address = self.addresses[self._next % len(self.addresses)]
+            self._next += 1
+        return _Channel(address, self.authkey)
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        for attempt in range(2):
+            try:
+                channel = self._idle.get_nowait()
+            except queue.Empty:
+                channel = self._open()
+            try:
+                out = channel.embed(batch)
+            except (EOFError, OSError) as ex:
+                # Worker restarted or connection dropped: discard the channel and retry once.
+                channel.close()
+                if attempt:
+                    raise
+                logger.warning("Inference pool connection lost, reconnecting: %s", ex)
+                continue
+            self._idle.put(channel)
+            return out
+        raise RuntimeError("unreachable")
+
+
+# ---------------------------------------------------------------- pool worker side
+
+def _build_forward():
+    import tensorflow as tf
+    from deepface import DeepFace
+
+    keras_model = DeepFace.build_model("Facenet512").model
+    _, h, w, c = keras_model.input_shape
+
+    @tf.function(input_signature=[tf.TensorSpec(shape=[None, h, w, c], dtype=tf.float32)])
+    def predict(batch):
+        return keras_model(batch, training=False)
+
+    return lambda batch: predict(tf.convert_to_tensor(batch)).numpy().astype(np.float32)
+
+
+def _serve_connection(conn, batcher):
+    attached = {}
+    try:
+        while True:
+            try:
+                name, n, h, w, c = conn.recv()
+            except EOFError:
+                break
+            try:
+                shm = attached.get(name)
+                if shm is None:
+                    for old in attached.values():
+                        old.close()
+                    attached = {name: _attach(name)}
+                    shm = attached[name]
+                batch = np.ndarray((n, h, w, c), dtype=np.float32, buffer=shm.buf)
+                vectors = batcher.run(batch)
+                out = np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf, offset=batch.nbytes)
+                out[:] = vectors
+                del batch, out
+                conn.send(("ok", int(vectors.shape[1])))
+            except Exception as ex:
+                logger.warning("Inference request failed: %s", ex)
+                conn.send(("error", str(ex)))
+    finally:
+        for shm in attached.values():
+            try:
+                shm.close()
+            except Exception:
+                pass
+        conn.close()
+
+
+def worker_main(host: str, port: int, authkey: bytes, max_batch_size: int, max_wait_ms: float):
+    """Entry point of one pool process: load the model once, then serve clients on `port`."""
+    from app.services.inference_batcher import MicroBatcher
+
+    logging.basicConfig(level=logging.INFO)
+    batcher = MicroBatcher(_build_forward(), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    with Listener((host, port), backlog=LISTEN_BACKLOG, authkey=authkey) as listener:
+        logger.info("Inference worker ready on %s:%d", host, port)
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=_serve_connection, args=(conn, batcher), daemon=True).start()
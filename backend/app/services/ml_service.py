@@ -1,14 +1,21 @@
 import logging
-from typing import Dict, Optional, Tuple
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
-from deepface import DeepFace
-import tensorflow as tf
+
+from app.config import Config
+from app.services.frame_pipeline import PreparedFrame, prepare_image
+from app.services.inference_batcher import MicroBatcher
 
 logger = logging.getLogger(__name__)
 
 MODEL_NAME = "Facenet512"
+MODEL_INPUT_SIZE = (160, 160)  # Facenet512 input (w, h), as DeepFace resizes with detector_backend="skip"
+MAX_FACES_PER_FRAME = 30
+FACE_PAD_RATIO = 0.22          # margin around the Haar box; every stored/query vector uses it
 
 
 class FaceRecognitionService:
@@ -28,34 +35,153 @@ class FaceRecognitionService:
         return cls._instance
 
     def _initialize(self):
-        tf.config.run_functions_eagerly(True)
-        self.model = DeepFace.build_model(MODEL_NAME)
+        # Only cheap state here: the model is loaded on first use (or by warm_up) so
+        # importing this module doesn't pull TensorFlow into app startup.
+        self.model = None
+        self.pool = None
+        self.batcher = None
+        self._predict = None
+        self.input_size = MODEL_INPUT_SIZE
+        self._loaded = False
+        # Loaded only means the forward pass was built (in pool mode nothing has been
+        # contacted yet); ready means a forward pass actually succeeded.
+        self._ready = False
+        self._loading = False
+        self._load_error = None
+        self._warmup_error = None
+        self._load_seconds = None
+        self._load_lock = threading.Lock()
+        self._warmup_thread = None
         self.face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
         )
-        logger.info("FaceRecognitionService initialized with OpenCV + Facenet512")
 
-    def _decode_image(self, img_array: np.ndarray) -> Optional[np.ndarray]:
-        if img_array is None:
+    def _ensure_loaded(self):
+        """Build the Facenet512 forward pass once; concurrent first callers wait on the same load."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._loading = True
+            started = time.perf_counter()
+            try:
+                self._load_model()
+                self._load_error = None
+            except Exception as ex:
+                self._load_error = str(ex)
+                logger.error("Facenet512 load failed: %s", ex)
+                raise
+            finally:
+                self._loading = False
+            self._load_seconds = round(time.perf_counter() - started, 2)
+            self._loaded = True
+            logger.info("FaceRecognitionService initialized with OpenCV + Facenet512 in %.2fs", self._load_seconds)
+
+    def _load_model(self):
+        if Config.FACE_INFERENCE_MODE == "pool":
+            # The model lives in the inference pool; this process never imports TensorFlow.
+            from app.services.inference_pool import InferenceClient, pool_authkey
+            self.pool = InferenceClient(
+                Config.FACE_INFERENCE_POOL_HOST,
+                Config.FACE_INFERENCE_POOL_PORT,
+                Config.FACE_INFERENCE_POOL_WORKERS,
+                pool_authkey(),
+            )
+            self._predict = self.pool.embed
+        else:
+            from deepface import DeepFace
+            self.model = DeepFace.build_model(MODEL_NAME)
+            self._predict = self._build_predict()
+        if self._predict is not None and Config.FACE_MICROBATCH_ENABLED:
+            self.batcher = MicroBatcher(
+                self._forward,
+                max_batch_size=Config.FACE_MICROBATCH_MAX_SIZE,
+                max_wait_ms=Config.FACE_MICROBATCH_MAX_WAIT_MS,
+            )
+
+    def warm_up(self, background: bool = True):
+        """
+        Load the model and trace the forward pass with a dummy batch, so the first
+        face request doesn't pay for it. Runs on a daemon thread unless background=False.
+        """
+        def _run():
+            try:
+                self._ensure_loaded()
+                if self._predict is not None:
+                    w, h = self.input_size
+                    self._forward(np.zeros((1, h, w, 3), dtype=np.float32))
+                else:
+                    self._ready = True  # DeepFace.represent fallback: the local model is built
+                self._warmup_error = None
+            except Exception as ex:
+                self._warmup_error = str(ex)
+                logger.warning("Model warm-up failed: %s", ex)
+
+        if not background:
+            _run()
+            return
+        if self._warmup_thread is None or not self._warmup_thread.is_alive():
+            self._warmup_thread = threading.Thread(target=_run, name="model-warmup", daemon=True)
+            self._warmup_thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def status(self) -> Dict:
+        """Readiness of the ML stack, for health checks."""
+        return {
+            "ready": self._ready,
+            "loaded": self._loaded,
+            "loading": self._loading,
+            "mode": Config.FACE_INFERENCE_MODE,
+            "loadSeconds": self._load_seconds,
+            "error": self._load_error,
+            "warmupError": self._warmup_error,
+        }
+
+    def _build_predict(self):
+        """
+        Graph-mode forward pass over the already-built Keras model.
+        A fixed input signature with a dynamic batch dimension means it is traced once
+        and reused for every batch size.
+        """
+        import tensorflow as tf
+
+        keras_model = getattr(self.model, "model", None)
+        if keras_model is None:
+            logger.warning("Facenet512 Keras model not exposed; falling back to DeepFace.represent")
             return None
-        if isinstance(img_array, np.ndarray):
-            return img_array
-        return None
-
-    def _detect_largest_face(self, img: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.2,
-            minNeighbors=6,
-            minSize=(80, 80),
-        )
-        if len(faces) == 0:
+
+        input_shape = getattr(keras_model, "input_shape", None)
+        if input_shape and len(input_shape) == 4 and input_shape[1] and input_shape[2]:
+            self.input_size = (int(input_shape[2]), int(input_shape[1]))
+        w, h = self.input_size
+
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None, h, w, 3], dtype=tf.float32)])
+        def predict(batch):
+            return keras_model(batch, training=False)
+
+        return lambda batch: predict(tf.convert_to_tensor(batch)).numpy()
+
+    def _decode_image(self, img_array) -> Optional[PreparedFrame]:
+        if img_array is None:
             return None
-        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
-        return int(x), int(y), int(w), int(h)
+        return prepare_image(img_array)
+
+    def _detect_faces(self, img) -> List[Tuple[int, int, int, int]]:
+        """All detected faces, largest first (Haar runs on the frame's downscaled gray view)."""
+        frame = prepare_image(img)
+        if frame is None:
+            return []
+        return frame.detect_faces(self.face_cascade, scale_factor=1.2, min_neighbors=6)
+
+    def _detect_largest_face(self, img) -> Optional[Tuple[int, int, int, int]]:
+        faces = self._detect_faces(img)
+        return faces[0] if faces else None
 
-    def _crop_with_padding(self, img: np.ndarray, bbox: Tuple[int, int, int, int], pad_ratio: float = 0.22):
+    def _crop_with_padding(self, img: np.ndarray, bbox: Tuple[int, int, int, int], pad_ratio: float = FACE_PAD_RATIO):
         x, y, w, h = bbox
         ih, iw = img.shape[:2]
         pad = int(max(w, h) * pad_ratio)
@@ -65,10 +191,15 @@ class FaceRecognitionService:
         y2 = min(ih, y + h + pad)
         return img[y1:y2, x1:x2]
 
-    def _frame_quality(self, img: np.ndarray, bbox: Tuple[int, int, int, int]) -> Dict:
+    def crop_face(self, img: np.ndarray, bbox: Tuple[int, int, int, int]) -> np.ndarray:
+        """The padded crop embed_regions feeds Facenet512, for callers with their own boxes."""
+        return self._crop_with_padding(img, bbox)
+
+    def _frame_quality(self, img, bbox: Tuple[int, int, int, int]) -> Dict:
+        frame = prepare_image(img)
         x, y, w, h = bbox
-        ih, iw = img.shape[:2]
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        ih, iw = frame.shape[:2]
+        gray = frame.gray
 
         brightness = float(gray.mean())
         blur = float(cv2.Laplacian(gray, cv2.CV_64F).var())
@@ -118,24 +249,27 @@ class FaceRecognitionService:
             "centerOffset": round(center_offset, 4),
         }
 
-    def _embed_face(self, face_img: np.ndarray) -> Optional[np.ndarray]:
-        try:
-            try:
-                result = DeepFace.represent(
-                    img_path=face_img,
-                    model_name=MODEL_NAME,
-                    model=self.model,
-                    enforce_detection=False,
-                    detector_backend="skip",
-                )
-            except TypeError:
-                result = DeepFace.represent(
-                    img_path=face_img,
-                    model_name=MODEL_NAME,
-                    enforce_detection=False,
-                    detector_backend="skip",
-                )
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(self._predict(batch), dtype=np.float32)
+        self._ready = True
+        return vectors
 
+    def batch_stats(self) -> Dict:
+        """Micro-batching metrics (achieved batch sizes, queue wait)."""
+        if self.batcher is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.batcher.stats()}
+
+    def _represent(self, face_img: np.ndarray) -> Optional[np.ndarray]:
+        """Single-crop DeepFace.represent path, used only when the Keras model isn't reachable."""
+        try:
+            from deepface import DeepFace
+            result = DeepFace.represent(
+                img_path=face_img,
+                model_name=MODEL_NAME,
+                enforce_detection=False,
+                detector_backend="skip",
+            )
             if not result:
                 return None
 
@@ -149,6 +283,91 @@ class FaceRecognitionService:
             logger.warning("Embedding generation failed: %s", ex)
             return None
 
+    def _preprocess_face(self, face_img: np.ndarray) -> np.ndarray:
+        """Same resize/scale DeepFace.represent applies with detector_backend="skip"."""
+        face = cv2.resize(face_img, self.input_size).astype(np.float32)
+        if face.max() > 1:
+            face = face / 255.0
+        return face
+
+    def embed_batch(self, face_imgs: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """
+        Embed BGR face crops with one compiled Facenet512 forward pass.
+        Returns one L2-normalized vector per crop (None for empty/failed crops).
+        """
+        out: List[Optional[np.ndarray]] = [None] * len(face_imgs)
+        valid = [i for i, f in enumerate(face_imgs) if f is not None and f.size > 0]
+        if not valid:
+            return out
+
+        try:
+            self._ensure_loaded()
+        except Exception:
+            return out
+
+        if self._predict is None:
+            for i in valid:
+                out[i] = self._represent(face_imgs[i])
+            return out
+
+        try:
+            batch = np.stack([self._preprocess_face(face_imgs[i]) for i in valid])
+            # Preprocessing stays on the request thread; only the forward pass is shared.
+            vectors = self.batcher.run(batch) if self.batcher is not None else self._forward(batch)
+        except Exception as ex:
+            logger.warning("Batched embedding failed: %s", ex)
+            return out
+
+        norms = np.linalg.norm(vectors, axis=1)
+        for row, i in enumerate(valid):
+            if norms[row] > 1e-9:
+                out[i] = vectors[row] / norms[row]
+        return out
+
+    def _embed_face(self, face_img: np.ndarray) -> Optional[np.ndarray]:
+        return self.embed_batch([face_img])[0]
+
+    def detect_faces(self, img_array, max_faces: int = MAX_FACES_PER_FRAME) -> List[Tuple[int, int, int, int]]:
+        """Face boxes (working-image pixels, largest first) without embedding them."""
+        frame = self._decode_image(img_array)
+        if frame is None:
+            return []
+        return self._detect_faces(frame)[:max_faces]
+
+    def embed_regions(self, frame: PreparedFrame, boxes: List[Tuple[int, int, int, int]]) -> List[Optional[Dict]]:
+        """
+        Crop and embed the given boxes of an already-detected frame in one batch.
+        Returns one generate_embedding-shaped dict per box (None where embedding failed).
+        """
+        if not boxes:
+            return []
+        crops = [self._crop_with_padding(frame.image, bbox) for bbox in boxes]
+        embeddings = self.embed_batch(crops)
+        return [
+            {
+                "embeddings": {MODEL_NAME: embedding.tolist()},
+                "bbox": frame.to_source(bbox),
+                "quality": self._frame_quality(frame, bbox),
+            } if embedding is not None else None
+            for bbox, embedding in zip(boxes, embeddings)
+        ]
+
+    def generate_embeddings(self, img_array: np.ndarray, max_faces: int = MAX_FACES_PER_FRAME) -> List[Dict]:
+        """
+        Multi-face variant of generate_embedding: every detected face (largest first,
+        capped at `max_faces`) is cropped and embedded in a single batch.
+        Returns a list of generate_embedding-shaped dicts.
+        """
+        try:
+            frame = self._decode_image(img_array)
+            if frame is None:
+                return []
+            results = self.embed_regions(frame, self.detect_faces(frame, max_faces))
+            return [r for r in results if r is not None]
+        except Exception as ex:
+            logger.error("generate_embeddings failed: %s", ex)
+            return []
+
     def generate_embedding(self, img_array: np.ndarray) -> Optional[Dict]:
         """
         Returns:
@@ -159,24 +378,23 @@ class FaceRecognitionService:
         }
         """
         try:
-            img = self._decode_image(img_array)
-            if img is None or img.size == 0:
+            frame = self._decode_image(img_array)
+            if frame is None:
                 return None
 
-            bbox = self._detect_largest_face(img)
+            bbox = self._detect_largest_face(frame)
             if bbox is None:
                 return None
 
-            quality = self._frame_quality(img, bbox)
-            face_img = self._crop_with_padding(img, bbox)
+            quality = self._frame_quality(frame, bbox)
+            face_img = self._crop_with_padding(frame.image, bbox)
             embedding = self._embed_face(face_img)
             if embedding is None:
                 return None
 
-            x, y, w, h = bbox
             return {
                 "embeddings": {MODEL_NAME: embedding.tolist()},
-                "bbox": {"x": x, "y": y, "w": w, "h": h},
+                "bbox": frame.to_source(bbox),
                 "quality": quality,
             }
         except Exception as ex:
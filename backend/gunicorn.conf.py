@@ -0,0 +1,16 @@
+"""
+Gunicorn settings (picked up automatically when gunicorn is started from backend/):
+    gunicorn --preload -w 4 run:app
+create_app() never warms the model up under gunicorn, because with --preload it runs in
+the master and TensorFlow is not fork-safe; each worker warms up here instead.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', 5000)}")
+
+
+def post_fork(server, worker):
+    from app.config import Config
+    if Config.FACE_MODEL_WARMUP:
+        from app.services.ml_service import ml_service
+        ml_service.warm_up()
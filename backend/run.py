@@ -3,13 +3,15 @@ import os
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 from app import create_app
 
-from app.models.user import User
+from app.models.indexes import ensure_all_indexes
 
 app = create_app()
 
 # Ensure indexes on first run
 with app.app_context():
-    User.ensure_indexes(app.db)
+    # Failures (e.g. duplicate (sessionId, studentId) attendance records blocking the unique
+    # index) are logged per collection; `python -m scripts.check_indexes` explains every query.
+    ensure_all_indexes(app.db)
 
 
 if __name__ == "__main__":
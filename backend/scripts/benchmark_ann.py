@@ -0,0 +1,98 @@
+"""Recall-vs-latency report for exact vs IVF gallery search.
+
+Run from backend dir:
+    python -m scripts.benchmark_ann                  # gallery from MongoDB
+    python -m scripts.benchmark_ann --synthetic 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.face_gallery import FaceGallery, user_record
+from app.services.gallery_index import ExactIndex, IVFIndex
+
+
+def load_mongo_gallery():
+    from app.extensions import get_mongo
+    from app.models.user import User
+
+    users = User.collection(get_mongo()).find({"faceRegistered": True})
+    return FaceGallery.from_records([rec for rec in (user_record(u) for u in users) if rec is not None])
+
+
+def synthetic_gallery(num_users, protos_per_user, dim, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_users, dim)).astype(np.float32)
+    records = []
+    for i in range(num_users):
+        protos = centers[i] + 0.35 * rng.normal(size=(protos_per_user, dim)).astype(np.float32)
+        records.append({"user_id": str(i), "name": f"user{i}", "rollNo": "", "prototypes": protos})
+    return FaceGallery.from_records(records)
+
+
+def make_queries(gallery, count, noise, seed):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(gallery.num_prototypes, size=min(count, gallery.num_prototypes), replace=False)
+    return gallery.matrix[rows] + noise * rng.normal(size=(rows.size, gallery.matrix.shape[1])).astype(np.float32)
+
+
+def time_search(index, gallery, queries, top_k):
+    picks = []
+    start = time.perf_counter()
+    for q in queries:
+        if index.approximate:
+            idx, _ = gallery.best_among(q, index.candidates(q, top_k))
+        else:
+            idx, _ = gallery.best_match(q)
+        picks.append(idx)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0 / max(1, len(queries))
+    return np.array(picks), elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=0, help="number of synthetic users (0 = load MongoDB)")
+    parser.add_argument("--protos", type=int, default=20, help="prototypes per synthetic user")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = sqrt(#prototypes))")
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        gallery = synthetic_gallery(args.synthetic, args.protos, args.dim, args.seed)
+    else:
+        gallery = load_mongo_gallery()
+    if not len(gallery):
+        print("Gallery is empty; nothing to benchmark.")
+        return
+
+    queries = make_queries(gallery, args.queries, args.noise, args.seed + 1)
+    print(f"Gallery: {len(gallery)} users, {gallery.num_prototypes} prototypes; {len(queries)} queries")
+
+    truth, exact_ms = time_search(ExactIndex(gallery), gallery, queries, args.top_k)
+    print(f"{'index':<22}{'recall@1':>10}{'ms/query':>12}{'build s':>10}")
+    print(f"{'exact':<22}{1.0:>10.4f}{exact_ms:>12.3f}{0.0:>10.2f}")
+
+    nlist = args.nlist or int(np.sqrt(gallery.num_prototypes))
+    start = time.perf_counter()
+    index = IVFIndex(gallery, nlist=nlist, nprobe=1, seed=args.seed)
+    build_s = time.perf_counter() - start
+    for nprobe in (int(p) for p in args.nprobe.split(",") if p.strip()):
+        index.nprobe = max(1, min(nprobe, index.nlist))
+        picks, ivf_ms = time_search(index, gallery, queries, args.top_k)
+        recall = float(np.mean(picks == truth))
+        label = f"ivf nlist={index.nlist} p={index.nprobe}"
+        print(f"{label:<22}{recall:>10.4f}{ivf_ms:>12.3f}{build_s:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Create the declared indexes, then explain() every route's query shape and flag collection scans.
+
+Run from backend dir:
+    python -m scripts.check_indexes            # create indexes + explain
+    python -m scripts.check_indexes --no-create
+Exits with status 1 if any query shape still needs a COLLSCAN.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.extensions import get_mongo
+from app.models.indexes import ensure_all_indexes, explain_query_shapes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-create", action="store_true", help="only explain, don't create indexes")
+    args = parser.parse_args()
+
+    db = get_mongo()
+    if not args.no_create:
+        for collection, status in ensure_all_indexes(db).items():
+            print(f"indexes {collection:<14}{status}")
+        print()
+
+    reports = explain_query_shapes(db)
+    print(f"{'query':<40}{'collection':<14}{'plan'}")
+    collscans = 0
+    for r in reports:
+        if "error" in r:
+            print(f"{r['query']:<40}{r['collection']:<14}ERROR {r['error']}")
+            continue
+        flags = []
+        if r["collscan"]:
+            flags.append("COLLSCAN")
+            collscans += 1
+        if r["inMemorySort"]:
+            flags.append("in-memory SORT")
+        plan = " <- ".join(r["stages"])
+        print(f"{r['query']:<40}{r['collection']:<14}{plan}{'  !! ' + ', '.join(flags) if flags else ''}")
+
+    print(f"\n{len(reports)} query shapes, {collscans} collection scan(s)")
+    sys.exit(1 if collscans else 0)
+
+
+if __name__ == "__main__":
+    main()
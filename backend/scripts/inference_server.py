@@ -0,0 +1,57 @@
+"""Run the Facenet512 inference worker pool. Run from backend dir: python -m scripts.inference_server
+
+Web workers connect to it when FACE_INFERENCE_MODE=pool. Both sides need the same
+FACE_INFERENCE_POOL_AUTHKEY (e.g. `python -c "import secrets; print(secrets.token_hex(32))"`).
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.services.inference_pool import pool_authkey, worker_main
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Facenet512 inference worker pool")
+    parser.add_argument("--workers", type=int, default=Config.FACE_INFERENCE_POOL_WORKERS)
+    parser.add_argument("--host", default=Config.FACE_INFERENCE_POOL_HOST)
+    parser.add_argument("--port", type=int, default=Config.FACE_INFERENCE_POOL_PORT)
+    args = parser.parse_args()
+    try:
+        authkey = pool_authkey()
+    except RuntimeError as ex:
+        parser.error(str(ex))
+
+    # Spawn (not fork) so every worker initializes TensorFlow in a clean process.
+    ctx = mp.get_context("spawn")
+    procs = []
+    for i in range(max(1, args.workers)):
+        p = ctx.Process(
+            target=worker_main,
+            args=(
+                args.host,
+                args.port + i,
+                authkey,
+                Config.FACE_MICROBATCH_MAX_SIZE,
+                Config.FACE_MICROBATCH_MAX_WAIT_MS,
+            ),
+            name=f"inference-worker-{i}",
+            daemon=False,
+        )
+        p.start()
+        procs.append(p)
+    print(f"Started {len(procs)} inference worker(s) on {args.host}:{args.port}-{args.port + len(procs) - 1}")
+
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
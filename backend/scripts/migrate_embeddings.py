@@ -0,0 +1,111 @@
+"""Rewrite stored face embeddings in the compact binary format (see app/services/embedding_codec.py).
+
+Run from backend dir:
+    python -m scripts.migrate_embeddings                 # FACE_EMBEDDING_FORMAT (float16)
+    python -m scripts.migrate_embeddings --format int8
+    python -m scripts.migrate_embeddings --dry-run       # report sizes only
+    python -m scripts.migrate_embeddings --promote-face-encoding
+Users already stored in the requested format are skipped, so the script can be rerun.
+Legacy single-photo `faceEncoding` vectors are left untouched unless
+--promote-face-encoding is given: then users with nothing newer get it as their base
+embedding (which puts them in live matching) and the old field is removed.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from pymongo import UpdateOne
+
+from app.config import Config
+from app.extensions import get_mongo
+from app.models.user import User
+from app.services.embedding_codec import (
+    EMBEDDING_FIELDS,
+    FACE_ENCODING_FIELD,
+    FORMAT_FLOAT16,
+    FORMAT_INT8,
+    LEGACY_FIELDS,
+    MODEL_NAME,
+    describe,
+    embedding_update,
+    stored_embedding,
+    stored_prototypes,
+)
+from app.services.gallery_snapshot import bump_version
+
+
+def _field_bytes(doc) -> int:
+    return len(bson.encode({f: doc[f] for f in EMBEDDING_FIELDS + (FACE_ENCODING_FIELD,) if f in doc}))
+
+
+def _up_to_date(doc, fmt, promote) -> bool:
+    if any(f in doc for f in LEGACY_FIELDS) or (promote and FACE_ENCODING_FIELD in doc):
+        return False
+    base = (doc.get("embeddings") or {}).get(MODEL_NAME)
+    prototypes = doc.get("embeddingPrototypes")
+    formats = [describe(v) for v in (base, prototypes) if v is not None]
+    return bool(formats) and all(f is not None and f[0] == fmt for f in formats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--format", choices=[FORMAT_FLOAT16, FORMAT_INT8], default=Config.FACE_EMBEDDING_FORMAT)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="compute sizes without writing")
+    parser.add_argument("--promote-face-encoding", action="store_true",
+                        help="move legacy faceEncoding vectors into the compact base embedding")
+    args = parser.parse_args()
+
+    db = get_mongo()
+    fields = EMBEDDING_FIELDS + ((FACE_ENCODING_FIELD,) if args.promote_face_encoding else ())
+    projection = {f: 1 for f in fields}
+    query = {"$or": [{f: {"$exists": True}} for f in fields]}
+    cursor = User.collection(db).find(query, projection).batch_size(args.batch_size)
+
+    ops = []
+    seen = migrated = skipped = failed = 0
+    before = after = 0
+    for doc in cursor:
+        seen += 1
+        if _up_to_date(doc, args.format, args.promote_face_encoding):
+            skipped += 1
+            continue
+        try:
+            base = stored_embedding(doc, include_face_encoding=args.promote_face_encoding)
+            prototypes = doc.get("embeddingPrototypes")
+            prototypes = stored_prototypes(doc) if prototypes is not None and len(prototypes) else None
+        except ValueError as ex:
+            print(f"  {doc['_id']}: {ex}")
+            failed += 1
+            continue
+        if base is None:
+            failed += 1
+            continue
+
+        to_set, to_unset = embedding_update(base, prototypes, fmt=args.format)
+        if args.promote_face_encoding:
+            to_unset[FACE_ENCODING_FIELD] = ""
+        before += _field_bytes(doc)
+        after += _field_bytes(to_set)
+        migrated += 1
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": to_set, "$unset": to_unset}))
+        if len(ops) >= args.batch_size and not args.dry_run:
+            User.collection(db).bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not args.dry_run:
+        User.collection(db).bulk_write(ops, ordered=False)
+    if migrated and not args.dry_run:
+        bump_version(db)    # workers rebuild their gallery (and snapshot) from the new fields
+
+    ratio = before / after if after else 0.0
+    print(f"{seen} user(s) with embeddings: {migrated} migrated to {args.format}, "
+          f"{skipped} already compact, {failed} unreadable")
+    print(f"embedding bytes {before:,} -> {after:,} ({ratio:.1f}x smaller)"
+          + (" [dry run, nothing written]" if args.dry_run else ""))
+
+
+if __name__ == "__main__":
+    main()
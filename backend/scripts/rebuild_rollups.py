@@ -0,0 +1,30 @@
+"""Recompute the attendance rollup counters from the attendances collection.
+
+Run from backend dir (ideally while no session is taking attendance):
+    python -m scripts.rebuild_rollups
+Run it once after upgrading to a build with rollups, so existing records are counted;
+the app itself never rebuilds them.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.extensions import get_mongo
+from app.models.attendance_rollup import AttendanceRollup
+from app.services.attendance_service import rebuild_rollups
+
+
+def main():
+    db = get_mongo()
+    AttendanceRollup.ensure_indexes(db)
+    written = rebuild_rollups(db)
+    if written is None:
+        print("Another rollup rebuild is running; try again when it has finished.")
+        sys.exit(1)
+    for kind, count in written.items():
+        print(f"{kind:<18}{count} counter(s)")
+
+
+if __name__ == "__main__":
+    main()
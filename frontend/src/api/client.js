@@ -81,10 +81,16 @@ export const sessionsApi = {
 
 export const attendanceApi = {
   list: (params) => api.get("/attendance", { params }),
+  // Full result set streamed by the server; format is "csv" or "ndjson".
+  export: (params, format = "csv") =>
+    api.get("/attendance", { params: { ...params, format }, responseType: "blob" }),
   mark: (data) => api.post("/attendance/mark", data),
 };
 
 export const faceApi = {
   verify: (formData) => api.post("/face/verify", formData),
   verifyPayload: (payload) => api.post("/face/verify", payload),
+  // Raw JPEG Blob body; sessionId/autoMark/multiFace go in the query string.
+  verifyFrame: (blob, params) =>
+    api.post("/face/verify", blob, { params, headers: { "Content-Type": "image/jpeg" } }),
 };
@@ -128,6 +128,19 @@ const FaceCaptureComponent = ({ onComplete, onError, numImages = 20 }) => {
         const apiError = error?.response?.data?.error || '';
         const reason = error?.response?.data?.reason || '';
 
+        if (reason === 'duplicate_identity') {
+          if (intervalRef.current) {
+            clearInterval(intervalRef.current);
+            intervalRef.current = null;
+          }
+          stopCamera();
+          setIsCapturing(false);
+          setSessionId(null);
+          setMessage(apiError.toUpperCase());
+          if (onError) onError(new Error(apiError));
+          return;
+        }
+
         if (reason === 'invalid_session' || /session/i.test(apiError)) {
           setMessage('SESSION LOST. RESTARTING...');
           if (intervalRef.current) {
@@ -181,7 +194,11 @@ const FaceCaptureComponent = ({ onComplete, onError, numImages = 20 }) => {
       }
     } catch (error) {
       console.error('Error completing registration:', error);
-      setMessage('Error: Failed to complete registration');
+      if (error?.response?.data?.reason === 'duplicate_identity') {
+        stopCamera();
+        setSessionId(null);
+      }
+      setMessage(`Error: ${error?.response?.data?.error || 'Failed to complete registration'}`);
       if (onError) onError(error);
     } finally {
       completingRef.current = false;
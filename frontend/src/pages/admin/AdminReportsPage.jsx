@@ -30,23 +30,17 @@ export function AdminReportsPage() {
   }, [dateFrom, dateTo]);
 
   const exportCsv = () => {
-    const headers = ["Date", "Time", "Student", "Subject", "Class", "Mode"];
-    const rows = attendances.map((a) => [
-      a.date,
-      a.time,
-      a.studentName,
-      a.subject,
-      a.class,
-      a.mode,
-    ]);
-    const csv = [headers.join(","), ...rows.map((r) => r.join(","))].join("\n");
-    const blob = new Blob([csv], { type: "text/csv" });
-    const url = URL.createObjectURL(blob);
-    const a = document.createElement("a");
-    a.href = url;
-    a.download = `attendance-${dateFrom || "all"}-${dateTo || "all"}.csv`;
-    a.click();
-    URL.revokeObjectURL(url);
+    const params = {};
+    if (dateFrom) params.dateFrom = dateFrom;
+    if (dateTo) params.dateTo = dateTo;
+    attendanceApi.export(params, "csv").then(({ data }) => {
+      const url = URL.createObjectURL(data);
+      const a = document.createElement("a");
+      a.href = url;
+      a.download = `attendance-${dateFrom || "all"}-${dateTo || "all"}.csv`;
+      a.click();
+      URL.revokeObjectURL(url);
+    });
   };
 
   const columns = [
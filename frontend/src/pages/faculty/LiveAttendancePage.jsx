@@ -16,7 +16,7 @@ export function LiveAttendancePage() {
   const { sessionId } = useParams();
   const navigate = useNavigate();
   const videoRef = useRef(null);
-  const { start, stop, captureBase64, error: webcamError, ready } = useWebcam(videoRef);
+  const { start, stop, captureBlob, error: webcamError, ready } = useWebcam(videoRef);
 
   const [session, setSession] = useState(null);
   const [presentCount, setPresentCount] = useState(0);
@@ -64,14 +64,13 @@ export function LiveAttendancePage() {
   // Scanning Logic
   const scanFrame = useCallback(async () => {
     if (!sessionId || scanning || ended) return;
-    const base64 = await captureBase64();
-    if (!base64) return;
+    // Raw JPEG body: no base64 encode here, no JSON parse + base64 decode on the server.
+    const blob = await captureBlob();
+    if (!blob) return;
     
     setScanning(true);
     try {
-      const { data } = await faceApi.verifyPayload({
-        image: base64, sessionId, autoMark: true,
-      });
+      const { data } = await faceApi.verifyFrame(blob, { sessionId, autoMark: true });
 
       if (data.matched && data.user) {
         const liveness = data.livenessStatus === "fake" ? "fake" : "real";
@@ -129,7 +128,7 @@ export function LiveAttendancePage() {
     } finally {
       setScanning(false);
     }
-  }, [sessionId, captureBase64, scanning, ended, mapBboxToOverlay]);
+  }, [sessionId, captureBlob, scanning, ended, mapBboxToOverlay]);
 
   // Timers and Cleanup
   useEffect(() => {